@@ -7,23 +7,46 @@
 # Author: Mason Huemmer
 # -------------------------------------------------------------------------------
 
+# -------------------------------------------------------------------------------
+# Startup Clock
+# -------------------------------------------------------------------------------
+import time
+startup_began = time.monotonic()
+
 # -------------------------------------------------------------------------------
 # Library Imports
 # -------------------------------------------------------------------------------
-from flask import Flask
-from flask_restx import Api, Resource, fields
-from influxdb import InfluxDBClient
+from flask import Flask, Response, request, stream_with_context
+from flask_restx import Api, Resource
 from app import helper
+from app import registry
+from app import writer
+from app import batcher
+from app import schema
+from app import streaming
+from app import batch
+from app import backfill
+from app import cache
+from app import server
+from app import metrics
+from app import validation
+from app import routing
+from app import pool
+from app import sketches
+from app import admission
+from app import columnar
+from app import lazy
 import logging.config
+import threading
 import argparse
 import logging
-import time
 import json
+import math
 import sys
 import os
 
 # -------------------------------------------------------------------------------
-# Environment Variables
+# Environment Variables (read by writer.get_writer)
 # -------------------------------------------------------------------------------
 # host          = os.environ['INFLUXDB_HOST']
 # port          = os.environ['INFLUXDB_PORT']
@@ -81,16 +104,185 @@ config = {
 logging.config.dictConfig(config)
 logger = logging.getLogger('main')
 
+# -------------------------------------------------------------------------------
+# Pipeline.MOJO Registry; loaded and watched once serving starts
+# -------------------------------------------------------------------------------
+model_registry = registry.get_registry(
+    os.environ.get('MOJO_PATH', registry.MOJO_DIRECTORY),
+    logging.getLogger('registry'),
+    float(os.environ.get('MOJO_WATCH_INTERVAL', 5.0))
+)
+
+# -------------------------------------------------------------------------------
+# Opt-in Micro-Batching in front of helper.model_run
+# - SCORING_BATCH_WINDOW_MS:  max time a request waits for others to join its batch
+# - SCORING_BATCH_MAX_ROWS:   max rows per predict call
+# -------------------------------------------------------------------------------
+batch_window_ms = float(os.environ.get('SCORING_BATCH_WINDOW_MS', 0))
+
+if batch_window_ms > 0:
+    scorer = batcher.MicroBatcher(
+        helper.model_run,
+        max_wait=batch_window_ms / 1000.0,
+        max_batch_rows=int(os.environ.get('SCORING_BATCH_MAX_ROWS', 256)),
+        logger=logging.getLogger('batcher')
+    )
+    model_run = scorer.run
+else:
+    model_run = helper.model_run
+
+# -------------------------------------------------------------------------------
+# Prediction Cache in front of model_run
+# - SCORING_CACHE_SIZE:       max cached rows per process (0, the default, disables)
+# - SCORING_CACHE_TTL:        seconds a cached prediction stays valid
+# - SCORING_CACHE_MAX_ROWS:   larger requests bypass the cache
+# - SCORING_CACHE_REDIS_URL:  optional backend shared by pre-forked workers
+# -------------------------------------------------------------------------------
+cache_size = int(os.environ.get('SCORING_CACHE_SIZE', 0))
+cache_ttl = float(os.environ.get('SCORING_CACHE_TTL', 3600))
+prediction_cache = None
+
+if cache_size > 0:
+    redis_url = os.environ.get('SCORING_CACHE_REDIS_URL')
+    prediction_cache = cache.PredictionCache(
+        max_entries=cache_size,
+        ttl=cache_ttl,
+        max_rows=int(os.environ.get('SCORING_CACHE_MAX_ROWS', 100)),
+        backend=cache.RedisBackend(redis_url, cache_ttl) if redis_url else None
+    )
+    model_registry.on_swap(prediction_cache.clear)
+    metrics.register_collector('scoring', prediction_cache.metrics, cache.PredictionCache.COUNTERS)
+    model_run = prediction_cache.wrap(model_run, lambda: model_registry.tag)
+
+# -------------------------------------------------------------------------------
+# Candidate (A/B) and Shadow Model Versions
+# - SCORING_PRIMARY_NAME:     version tag for the primary pipeline
+# - SCORING_CANDIDATE_MOJO:   pipeline answering SCORING_CANDIDATE_SHARE of traffic
+# - SCORING_SHADOW_MOJO:      pipeline scoring every request off the request path
+# - SCORING_SHADOW_WORKERS:   threads available to shadow scoring
+# -------------------------------------------------------------------------------
+influx_measurement = 'sale_prices'
+model_registries = [model_registry]
+
+# -------------------------------------------------------------------------------
+# Streaming Feature-Drift Sketches, flushed to InfluxDB as per-window summaries
+# - SCORING_DRIFT_INTERVAL:     seconds per summary window (0 disables)
+# - SCORING_DRIFT_ACCURACY:     relative error of the numeric quantiles
+# - SCORING_DRIFT_TOP:          heavy hitters kept per categorical field
+# - SCORING_DRIFT_MAX_PENDING:  scored batches waiting for the sketch thread
+# -------------------------------------------------------------------------------
+drift_interval = float(os.environ.get('SCORING_DRIFT_INTERVAL', 60))
+feature_sketches = None
+
+if drift_interval > 0:
+    feature_sketches = sketches.FeatureSketches(
+        measurement=os.environ.get('SCORING_DRIFT_MEASUREMENT', 'feature_sketches'),
+        interval=drift_interval,
+        submit=lambda lines: writer.get_writer().submit(lines),
+        accuracy=float(os.environ.get('SCORING_DRIFT_ACCURACY', 0.01)),
+        top=int(os.environ.get('SCORING_DRIFT_TOP', 10)),
+        max_pending=int(os.environ.get('SCORING_DRIFT_MAX_PENDING', 256)),
+        logger=logging.getLogger('sketches')
+    )
+    metrics.register_collector('scoring', feature_sketches.metrics, sketches.FeatureSketches.COUNTERS)
+
+def record_scores(version, role, scores, payload, seconds, deltas, measurement=influx_measurement):
+    extra = {'PREDICT MS': [seconds * 1000.0] * len(scores['SALE PRICE'])}
+    if deltas is not None:
+        extra['SALE PRICE DELTA'] = deltas
+
+    with metrics.stage('scores_payload'):
+        data = helper.create_scores_payload(measurement, scores, payload, tags={'version': version, 'role': role}, extra=extra)
+
+    with metrics.stage('influx'):
+        writer.get_writer().submit(data)
+
+    if feature_sketches is not None:
+        with metrics.stage('sketches'):
+            feature_sketches.update(version, role, scores, payload)
+
+def version_run(path):
+    version_registry = registry.ModelRegistry(path, logging.getLogger('registry'), model_registry.interval)
+    model_registries.append(version_registry)
+    return lambda payload, logger: helper.model_run(payload, logger, version_registry)
+
+candidate_path = os.environ.get('SCORING_CANDIDATE_MOJO')
+shadow_path = os.environ.get('SCORING_SHADOW_MOJO')
+
+router = routing.ModelRouter(
+    primary=(os.environ.get('SCORING_PRIMARY_NAME', 'primary'), model_run),
+    candidate=(os.environ.get('SCORING_CANDIDATE_NAME', 'candidate'), version_run(candidate_path)) if candidate_path else None,
+    share=float(os.environ.get('SCORING_CANDIDATE_SHARE', 0.0)),
+    shadows=[(os.environ.get('SCORING_SHADOW_NAME', 'shadow'), version_run(shadow_path))] if shadow_path else [],
+    record=record_scores,
+    shadow_workers=int(os.environ.get('SCORING_SHADOW_WORKERS', 2)),
+    logger=logging.getLogger('router')
+)
+model_run = router.model_run
+
+# -------------------------------------------------------------------------------
+# Admission Control in front of model_run
+# - SCORING_CONCURRENCY:          requests scored at once per process
+# - SCORING_QUEUE_SIZE:           requests allowed to wait for a slot
+# - SCORING_INTERACTIVE_ROWS:     requests this small jump ahead of large batches
+# - SCORING_DEFAULT_DEADLINE_MS:  deadline when X-Request-Deadline-Ms is not sent
+# - SCORING_MAX_DEADLINE_MS:      longer X-Request-Deadline-Ms values are capped
+# -------------------------------------------------------------------------------
+admission_control = admission.AdmissionController(
+    concurrency=int(os.environ.get('SCORING_CONCURRENCY', 4)),
+    max_queue=int(os.environ.get('SCORING_QUEUE_SIZE', 256)),
+    interactive_rows=int(os.environ.get('SCORING_INTERACTIVE_ROWS', 10)),
+    logger=logging.getLogger('admission')
+)
+default_deadline_ms = float(os.environ.get('SCORING_DEFAULT_DEADLINE_MS', 5000))
+max_deadline_ms = float(os.environ.get('SCORING_MAX_DEADLINE_MS', 60000))
+
 # -------------------------------------------------------------------------------
 # Initialize Flask
 # -------------------------------------------------------------------------------
 app = Flask("Housing Model")
 api = Api(app)
 
+# -------------------------------------------------------------------------------
+# Per-Stage Timings as a Server-Timing Header (not registered when SCORING_METRICS=0)
+# -------------------------------------------------------------------------------
+if metrics.ENABLED:
+    @app.before_request
+    def begin_timing():
+        metrics.begin_request()
+
+    @app.after_request
+    def add_server_timing(response):
+        timings = metrics.end_request()
+        if timings:
+            response.headers['Server-Timing'] = metrics.server_timing(timings)
+        return response
+
+metrics.register_collector('scoring_writer', lambda: writer.get_writer().metrics(), writer.ScoreWriter.COUNTERS)
+metrics.register_collector('scoring_router', router.metrics, routing.ModelRouter.COUNTERS)
+metrics.register_collector('scoring_admission', admission_control.metrics, admission.AdmissionController.COUNTERS)
+
+# -------------------------------------------------------------------------------
+# Readiness and Startup Time
+# - SCORING_WARMUP_REQUESTS:  synthetic predictions run before /ready turns 200
+# -------------------------------------------------------------------------------
+warmup_requests = int(os.environ.get('SCORING_WARMUP_REQUESTS', 3))
+ready = threading.Event()
+startup = {'seconds': None}
+
+metrics.register_collector('scoring', lambda: {
+    'ready': int(ready.is_set()),
+    'startup_seconds': startup['seconds'] if startup['seconds'] is not None else 'NaN'
+})
+
 # -------------------------------------------------------------------------------
 # API Methods
 # - GET:  Ping
+# - GET:  Ready
+# - GET:  Metrics
 # - POST: Score 
+# - POST: Score with a Pooled Model
+# - POST: Score Stream
 # -------------------------------------------------------------------------------
 
 # -------------------------------------------------------------------------------
@@ -102,30 +294,32 @@ class Ping(Resource):
         ping = {"status":"Connection Successful"}
         return json.dumps(ping)
 
+# -------------------------------------------------------------------------------
+# GET Method: Ready (503 until the model is loaded and warm)
+# -------------------------------------------------------------------------------
+@api.route('/ready', methods=['GET'])
+class Ready(Resource):
+    def get(self):
+        if not ready.is_set():
+            return {"status": "Warming Up"}, 503
+        return {"status": "Ready", "startup_seconds": startup['seconds']}
+
+# -------------------------------------------------------------------------------
+# GET Method: Metrics
+# -------------------------------------------------------------------------------
+@api.route('/metrics', methods=['GET'])
+class Metrics(Resource):
+    def get(self):
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # -------------------------------------------------------------------------------
 # Model Input / Output for API Decorators
 # -------------------------------------------------------------------------------
-model_input = api.model(
-    'housing_model_input', 
-    {
-        'BOROUGH' : fields.Integer,
-        'NEIGHBORHOOD' : fields.String(),
-        'BUILDING_CLASS_CATEGORY': fields.String(),
-        'COMMERCIAL_UNITS': fields.Integer,
-        'TOTAL_UNITS': fields.Integer,
-        'LAND_SQUARE_FEET': fields.Integer,
-        'GROSS_SQUARE_FEET': fields.Integer,
-        'YEAR_BUILT': fields.Integer,
-        'BUILDING_CLASS_AT_TIME_OF_SALE': fields.String()
-    }
-)
+model_input = api.add_model('housing_model_input', schema.model_input)
+model_output = api.add_model('housing_model_output', schema.model_output)
 
-model_output = api.model (
-    'housing_model_output',
-    {
-        "SALE PRICE" : fields.List(fields.Float)
-    }
-)
+validate_input = validation.compile_validator(schema.model_input)
+serialize_output = validation.compile_serializer(schema.model_output)
 
 # -------------------------------------------------------------------------------
 # POST Method: Score
@@ -133,46 +327,301 @@ model_output = api.model (
 @api.route('/score')
 class Model(Resource):
     @api.expect(model_input)
-    @api.marshal_with(model_output)
+    @api.response(200, 'Success', model_output)
+    @api.response(400, 'Input payload validation failed')
+    @api.response(415, 'Columnar request without pyarrow installed')
+    @api.response(503, 'Request shed; retry after the Retry-After header')
     def post(self):
+        return score_request(model_run)
 
-        # -------------------------------------------------------------------------------
-        # Initialize Variables
-        # -------------------------------------------------------------------------------
-        influx_measurement = 'sale_prices'
+# -------------------------------------------------------------------------------
+# POST Method: Score with a Pooled Model
+# - SCORING_MODEL_DIRECTORY:  holds <name>/pipeline.mojo for every pooled model
+# - SCORING_MODEL_MEMORY_MB:  memory budget per process (0 keeps every model loaded)
+# - SCORING_POOLED_MEASUREMENT:  pooled scores are kept apart from sale_prices, so
+#   backfills and drift sketches only see the primary model's traffic
+# -------------------------------------------------------------------------------
+pooled_measurement = os.environ.get('SCORING_POOLED_MEASUREMENT', 'sale_prices_pooled')
+model_pool = pool.ModelPool(
+    os.environ.get('SCORING_MODEL_DIRECTORY', './lib/models'),
+    memory_budget_mb=int(os.environ.get('SCORING_MODEL_MEMORY_MB', 0)),
+    warmup_requests=warmup_requests,
+    interval=model_registry.interval,
+    logger=logging.getLogger('pool')
+)
+metrics.register_collector('scoring', model_pool.metrics, pool.ModelPool.COUNTERS)
 
-        # -------------------------------------------------------------------------------
-        # Connect to InfluxDB
-        # -------------------------------------------------------------------------------
-        client = InfluxDBClient(host=host, port=port, username=username, password=password)
-        client.create_database(database)
+@api.route('/models/<string:name>/score')
+class PooledModel(Resource):
+    @api.expect(model_input)
+    @api.response(200, 'Success', model_output)
+    @api.response(400, 'Input payload validation failed')
+    @api.response(404, 'No such model')
+    @api.response(503, 'Request shed; retry after the Retry-After header')
+    def post(self, name):
+        try:
+            model_pool.path(name)
+        except KeyError:
+            return json_response({"message": "No such model: {0}".format(name)}, 404)
 
-        # -------------------------------------------------------------------------------
-        # RETURN MOJO Scores
-        # -------------------------------------------------------------------------------
-        scores = helper.model_run(api.payload, logger)
+        def pooled_run(payload, logger):
+            version_registry = model_pool.get(name)
+            started = time.perf_counter()
+            scores = helper.model_run(payload, logger, version_registry)
+            elapsed = time.perf_counter() - started
+            metrics.observe_pooled(name, elapsed)
+            record_scores(name, 'pooled', scores, payload, elapsed, None, pooled_measurement)
+            return scores
+
+        return score_request(pooled_run)
+
+def score_request(run):
+
+    # -------------------------------------------------------------------------------
+    # Negotiate JSON (default) or an Arrow IPC Stream by Content-Type / Accept
+    # -------------------------------------------------------------------------------
+    columnar_request = request.mimetype == columnar.ARROW_STREAM
+    offers = ['application/json', columnar.ARROW_STREAM]
+    if columnar_request:
+        offers.reverse()
+    columnar_response = request.accept_mimetypes.best_match(offers, offers[0]) == columnar.ARROW_STREAM
+
+    # -------------------------------------------------------------------------------
+    # Parse and Validate the Whole Payload in One Pass; columnar requests decode
+    # straight into a typed Frame
+    # -------------------------------------------------------------------------------
+    with metrics.stage('parse'):
+        try:
+            if columnar_request:
+                payload = columnar.decode_frame(request.get_data())
+                errors = None
+            else:
+                payload = validation.loads(request.get_data())
+                errors = validate_input(payload)
+        except ImportError:
+            return json_response({"message": "Columnar requests require pyarrow"}, 415)
+        except ValueError as e:
+            return json_response({"message": "Invalid {0}: {1}".format('Arrow stream' if columnar_request else 'JSON', e)}, 400)
+
+    if errors:
+        return json_response({"message": "Input payload validation failed", "errors": errors}, 400)
+
+    if columnar_request:
+        rows = payload.nrows
+    else:
+        rows = len(payload) if type(payload) == list else 1
+    metrics.observe_rows('request', rows)
+
+    deadline = request_deadline()
+    if deadline is None:
+        return json_response({"message": "Invalid X-Request-Deadline-Ms header; expected a positive number of milliseconds"}, 400)
+
+    # -------------------------------------------------------------------------------
+    # RETURN MOJO Scores once Admitted; the run queues the score records for
+    # InfluxDB with the answering version as a tag
+    # -------------------------------------------------------------------------------
+    try:
+        with metrics.stage('queue'):
+            slot = admission_control.admit(rows, deadline)
+    except admission.Rejected as e:
+        return json_response({"message": str(e)}, 503, {'Retry-After': str(e.retry_after)})
+
+    with slot:
+        scores = run(payload, logger)
+
+    # -------------------------------------------------------------------------------
+    # Return Scores to Flask API in the housing_model_output Shape, or as an
+    # Arrow IPC stream
+    # -------------------------------------------------------------------------------
+    if columnar_response:
+        try:
+            with metrics.stage('serialize'):
+                body = columnar.encode_scores(scores)
+        except ImportError:
+            return json_response({"message": "Columnar responses require pyarrow"}, 406)
+        return Response(body, status=200, mimetype=columnar.ARROW_STREAM)
+
+    return json_response(serialize_output(scores), 200)
+
+def json_response(body, status, headers=None):
+    return Response(validation.dumps(body), status=status, headers=headers, mimetype='application/json')
+
+def request_deadline():
+
+    # -------------------------------------------------------------------------------
+    # Seconds Allowed to Wait for a Slot, capped; None when the header is invalid
+    # -------------------------------------------------------------------------------
+    try:
+        deadline_ms = float(request.headers.get('X-Request-Deadline-Ms', default_deadline_ms))
+    except ValueError:
+        return None
+    if not math.isfinite(deadline_ms) or deadline_ms <= 0:
+        return None
+    return min(deadline_ms, max_deadline_ms) / 1000.0
+
+# -------------------------------------------------------------------------------
+# POST Method: Score Stream
+# - Request:  newline-delimited housing_model_input records
+# - Response: newline-delimited {"SALE PRICE": ...} records, in input order, with
+#             {"line": ..., "error": ...} in place of records that fail to parse,
+#             validate or score
+# -------------------------------------------------------------------------------
+@api.route('/score/stream')
+class ModelStream(Resource):
+    @api.response(200, 'Success')
+    @api.response(400, 'Invalid X-Request-Deadline-Ms header')
+    def post(self):
 
         # -------------------------------------------------------------------------------
-        # Return Scores Payload
+        # Initialize Variables; X-Request-Deadline-Ms applies to each chunk's wait
+        # for a scoring slot
         # -------------------------------------------------------------------------------
-        data = helper.create_scores_payload(influx_measurement, scores, api.payload)
-     
+        chunk_size = int(os.environ.get('SCORING_STREAM_CHUNK_ROWS', 1000))
+        deadline = request_deadline()
+        if deadline is None:
+            return json_response({"message": "Invalid X-Request-Deadline-Ms header; expected a positive number of milliseconds"}, 400)
+
         # -------------------------------------------------------------------------------
-        # Write to InfluxDB
+        # Each Chunk is Admitted like a /score Request and Routed like one, so it
+        # reaches candidates and shadows and is recorded with the answering version
+        # as a tag; a shed chunk is reported in place and the stream carries on
         # -------------------------------------------------------------------------------
-        client.write_points(data, database=database, time_precision='ms', protocol='json')        
+        def chunk_run(chunk, logger):
+            with admission_control.admit(len(chunk), deadline):
+                return model_run(chunk, logger)
 
         # -------------------------------------------------------------------------------
-        # Return Scores to Flask API
+        # Read, Score and Return Chunks Incrementally
         # -------------------------------------------------------------------------------
-        return scores
+        lines = streaming.score_ndjson(request.stream, chunk_run, logger, chunk_size, None, validate_input)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+# -------------------------------------------------------------------------------
+# Serve the Flask API
+# -------------------------------------------------------------------------------
+def start_up():
+
+    # -------------------------------------------------------------------------------
+    # Load Every Pipeline.MOJO Version Once, Warm it up and Watch for New Versions
+    # -------------------------------------------------------------------------------
+    for version_registry in model_registries:
+        version_registry.load()
+        helper.warm_up(warmup_requests, logger, version_registry)
+        version_registry.watch()
+
+    startup['seconds'] = time.monotonic() - startup_began
+    ready.set()
+    logger.info("Ready after {0:.2f}s ({1} warm-up predictions)".format(startup['seconds'], warmup_requests))
+
+def serve(args):
+    lazy.preload('datatable')
+
+    # -------------------------------------------------------------------------------
+    # Development Server: one process; /ping answers while the model warms up
+    # -------------------------------------------------------------------------------
+    if args.workers <= 0:
+        threading.Thread(target=start_up, name='start-up', daemon=True).start()
+        writer.get_writer()
+        app.run(host=args.host, port=args.port)
+        return
+
+    # -------------------------------------------------------------------------------
+    # Warm the Model in the Master so Every Worker Forks Ready
+    # -------------------------------------------------------------------------------
+    start_up()
+
+    # -------------------------------------------------------------------------------
+    # Pre-Fork Server: workers share the master's model pages copy-on-write and
+    # are recycled from the master whenever a new MOJO is loaded
+    # -------------------------------------------------------------------------------
+    prefork = server.PreforkServer(
+        app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        max_requests=args.max_requests,
+        max_memory_mb=args.max_memory_mb,
+        graceful_timeout=args.graceful_timeout,
+        logger=logging.getLogger('server'),
+        post_fork=writer.get_writer,
+        pre_exit=lambda: worker_exit(args.graceful_timeout)
+    )
+    for version_registry in model_registries:
+        version_registry.on_swap(prefork.reload)
+    prefork.run()
+
+def worker_exit(timeout):
+
+    # -------------------------------------------------------------------------------
+    # Flush the Last Sketch Window into the Writer, then Drain it to InfluxDB
+    # -------------------------------------------------------------------------------
+    if feature_sketches is not None:
+        feature_sketches.flush()
+    writer.get_writer().close(timeout)
+
+# -------------------------------------------------------------------------------
+# Score a CSV or Parquet File Offline
+# -------------------------------------------------------------------------------
+def score_file(args):
+    batch.score_file(
+        args.input,
+        args.output,
+        model_path=args.model,
+        chunk_rows=args.chunk_rows,
+        workers=args.workers,
+        resume=args.resume,
+        logger=logging.getLogger('batch')
+    )
+
+# -------------------------------------------------------------------------------
+# Re-Score Historical Requests from InfluxDB with a Chosen Pipeline.MOJO
+# -------------------------------------------------------------------------------
+def backfill_history(args):
+    backfill.backfill(
+        args.start,
+        args.end,
+        model_path=args.model,
+        version=args.version,
+        source=args.source,
+        target=args.target,
+        window=args.window,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        checkpoint=args.checkpoint,
+        resume=args.resume,
+        logger=logging.getLogger('backfill')
+    )
 
 # -------------------------------------------------------------------------------
 # Console Entry Point
+# - serve (default) [--host] [--port] [--workers] [--max-requests] [--max-memory-mb]
+# - score-file INPUT OUTPUT [--model] [--chunk-rows] [--workers] [--no-resume]
+# - backfill START [END] [--model] [--version] [--source] [--target] [--window-minutes]
+#   [--workers] [--chunk-size] [--checkpoint] [--no-resume]
 # -------------------------------------------------------------------------------
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='scoring-pipeline', description='Housing Model Api')
+    subparsers = parser.add_subparsers(dest='command')
+    serve_parser = subparsers.add_parser('serve', help='Run the scoring API (default)')
+    serve_parser.set_defaults(func=serve)
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    serve_parser.add_argument('--port', type=int, default=8080)
+    serve_parser.add_argument('--workers', type=int, default=int(os.environ.get('SCORING_WORKERS', 0)), help='Pre-forked worker processes (0 runs the Flask development server)')
+    serve_parser.add_argument('--max-requests', type=int, default=int(os.environ.get('SCORING_MAX_REQUESTS', 0)), help='Recycle a worker after this many requests (0 disables)')
+    serve_parser.add_argument('--max-memory-mb', type=int, default=int(os.environ.get('SCORING_MAX_MEMORY_MB', 0)), help='Recycle a worker once its memory has grown this much since fork (0 disables)')
+    serve_parser.add_argument('--graceful-timeout', type=float, default=30.0, help='Seconds workers get to finish in-flight requests on shutdown')
+    score_file_parser = subparsers.add_parser('score-file', help='Score a CSV or Parquet file offline')
+    score_file_parser.set_defaults(func=score_file)
+    batch.add_arguments(score_file_parser)
+    backfill_parser = subparsers.add_parser('backfill', help='Re-score historical requests stored in InfluxDB')
+    backfill_parser.set_defaults(func=backfill_history)
+    backfill.add_arguments(backfill_parser)
+    args = parser.parse_args()
+
     try:
-        app.run(host="0.0.0.0", port=8080)
+        if getattr(args, 'func', None) is None:
+            args = parser.parse_args(['serve'] + sys.argv[1:])
+        args.func(args)
     except SystemExit as e:
         logger.exception('main failed with exception')
         logger.error(str(e))
\ No newline at end of file
@@ -0,0 +1,162 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+import threading
+import itertools
+import logging
+import heapq
+import math
+import time
+
+# -------------------------------------------------------------------------------
+# ADMISSION CONTROL
+# - AdmissionController(concurrency, max_queue, interactive_rows)
+# - admit(rows, deadline) -> context manager holding a scoring slot
+# - Rejected(message, retry_after)
+# -------------------------------------------------------------------------------
+
+class Rejected(Exception):
+    def __init__(self, message, retry_after):
+        Exception.__init__(self, message)
+        self.retry_after = retry_after
+
+class _Waiter:
+    __slots__ = ('priority', 'rows', 'deadline', 'estimate', 'granted')
+
+    def __init__(self, priority, rows, deadline, estimate):
+        self.priority = priority
+        self.rows = rows
+        self.deadline = deadline
+        self.estimate = estimate
+        self.granted = False
+
+    def __lt__(self, other):
+        return self.priority < other.priority
+
+class AdmissionController:
+    COUNTERS = ('admitted', 'shed', 'expired')
+
+    def __init__(self, concurrency=4, max_queue=256, interactive_rows=10, logger=None):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.interactive_rows = interactive_rows
+        self.logger = logger or logging.getLogger('admission')
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        self.expired = 0
+        self._waiting = []
+        self._condition = threading.Condition()
+        self._sequence = itertools.count()
+
+        # -------------------------------------------------------------------------------
+        # Service Time Model: seconds = fixed + per_row * rows, smoothed by EWMA
+        # -------------------------------------------------------------------------------
+        self._fixed = 0.005
+        self._per_row = 0.0001
+
+    def estimate(self, rows):
+        return self._fixed + self._per_row * rows
+
+    # -------------------------------------------------------------------------------
+    # Queue Order: interactive requests first, then arrival order within a class
+    # -------------------------------------------------------------------------------
+    def admit(self, rows, deadline):
+        now = time.monotonic()
+        estimate = self.estimate(rows)
+        klass = 0 if rows <= self.interactive_rows else 1
+        waiter = _Waiter((klass, next(self._sequence)), rows, now + deadline, estimate)
+
+        with self._condition:
+
+            # -------------------------------------------------------------------------------
+            # Shed Early when the Request Cannot Finish in Time; an idle controller
+            # always admits, since the service time estimate is only a guess until
+            # requests have trained it
+            # -------------------------------------------------------------------------------
+            wait = self._expected_wait(waiter)
+            busy = self._waiting or self.in_flight
+            if len(self._waiting) >= self.max_queue or (busy and now + wait + estimate > waiter.deadline):
+                self.shed += 1
+                self.logger.debug("Shedding {0} rows; expected wait {1:.3f}s".format(rows, wait))
+                raise Rejected("Request cannot be scored within its deadline", self._retry_after(wait))
+
+            heapq.heappush(self._waiting, waiter)
+            self._dispatch()
+
+            # -------------------------------------------------------------------------------
+            # Leave the Queue on any Exit without a Slot, or hand back a slot granted
+            # just as the wait was interrupted
+            # -------------------------------------------------------------------------------
+            try:
+                while not waiter.granted:
+                    remaining = waiter.deadline - waiter.estimate - time.monotonic()
+                    if remaining <= 0:
+                        self.expired += 1
+                        raise Rejected("Request deadline expired while queued", self._retry_after(self._expected_wait(waiter)))
+                    self._condition.wait(min(remaining, threading.TIMEOUT_MAX))
+            except BaseException:
+                if waiter.granted:
+                    self.in_flight -= 1
+                    self._dispatch()
+                else:
+                    self._waiting.remove(waiter)
+                    heapq.heapify(self._waiting)
+                raise
+
+        return _Slot(self, rows)
+
+    def _expected_wait(self, waiter):
+        ahead = sum(other.estimate for other in self._waiting if other < waiter)
+        if self.in_flight < self.concurrency and not ahead:
+            return 0.0
+        busy = self.in_flight * self.estimate(self.interactive_rows) / 2.0
+        return (ahead + busy) / self.concurrency
+
+    def _retry_after(self, wait):
+        return max(int(math.ceil(wait)), 1)
+
+    def _dispatch(self):
+        while self._waiting and self.in_flight < self.concurrency:
+            waiter = heapq.heappop(self._waiting)
+            waiter.granted = True
+            self.in_flight += 1
+            self.admitted += 1
+        self._condition.notify_all()
+
+    def _release(self, rows, seconds):
+        with self._condition:
+            self.in_flight -= 1
+
+            # -------------------------------------------------------------------------------
+            # Update the Service Time Model from what the Request Actually Took
+            # -------------------------------------------------------------------------------
+            per_row = max(seconds - self._fixed, 0.0) / max(rows, 1)
+            self._per_row += 0.1 * (per_row - self._per_row)
+            if rows <= self.interactive_rows:
+                self._fixed += 0.1 * (seconds - self._fixed)
+
+            self._dispatch()
+
+    def metrics(self):
+        return {
+            'queue_depth': len(self._waiting),
+            'in_flight': self.in_flight,
+            'admitted': self.admitted,
+            'shed': self.shed,
+            'expired': self.expired
+        }
+
+class _Slot:
+    def __init__(self, controller, rows):
+        self.controller = controller
+        self.rows = rows
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.controller._release(self.rows, time.monotonic() - self.started)
+        return False
@@ -0,0 +1,294 @@
+# -------------------------------------------------------------------------------
+# Name: asgi.py
+# Purpose: Housing Model Api (ASGI)
+# Usage: uvicorn app.asgi:application --workers 1
+# -------------------------------------------------------------------------------
+
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import urlencode
+from .registry import get_registry, MOJO_DIRECTORY
+from .validation import compile_validator, loads
+from .schema import model_input
+from .lazy import preload
+from . import metrics
+from . import helper
+import asyncio
+import logging
+import aiohttp
+import json
+import os
+
+logger = logging.getLogger('asgi')
+
+# -------------------------------------------------------------------------------
+# ASGI HOUSING MODEL API
+# - GET:  /ping
+# - GET:  /metrics  Prometheus text, like the Flask API
+# - POST: /score   validated like the Flask API; invalid payloads get a 400
+# - Settings
+#   - SCORING_EXECUTOR:          'thread' (default) or 'process' (restarted when the MOJO changes)
+#   - SCORING_EXECUTOR_WORKERS:  predict calls that run at once
+#   - SCORING_EXECUTOR_QUEUE:    predict calls that may wait for a worker
+# -------------------------------------------------------------------------------
+
+class AsyncScoreWriter:
+    COUNTERS = ('dropped', 'written', 'failed')
+
+    def __init__(self, host, port, username, password, database, max_queue=10000,
+                 batch_size=500, flush_interval=1.0, logger=None):
+        self.url = 'http://{0}:{1}'.format(host, port)
+        self.auth = aiohttp.BasicAuth(username, password)
+        self.database = database
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logger or logging.getLogger('writer')
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._session = None
+        self._queue = None
+        self._task = None
+
+    # -------------------------------------------------------------------------------
+    # Pooled, Non-Blocking HTTP Session to InfluxDB
+    # -------------------------------------------------------------------------------
+    async def start(self):
+        self._session = aiohttp.ClientSession(auth=self.auth)
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        try:
+            await self._post('/query', data={'q': 'CREATE DATABASE "{0}"'.format(self.database)})
+        except Exception:
+            self.logger.exception("Failed to create InfluxDB database {0}".format(self.database))
+        self._task = asyncio.ensure_future(self._run())
+
+    def submit(self, lines):
+        for line in lines:
+            try:
+                self._queue.put_nowait(line)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    def metrics(self):
+        return {
+            'queue_depth': self._queue.qsize() if self._queue else 0,
+            'dropped': self.dropped,
+            'written': self.written,
+            'failed': self.failed
+        }
+
+    # -------------------------------------------------------------------------------
+    # Background Flush by Batch Size or Age
+    # -------------------------------------------------------------------------------
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        batch = []
+        deadline = None
+
+        while True:
+            timeout = self.flush_interval if deadline is None else max(deadline - loop.time(), 0)
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                if deadline is None:
+                    deadline = loop.time() + self.flush_interval
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                break
+
+            if batch and (len(batch) >= self.batch_size or loop.time() >= deadline):
+                await self._flush(batch)
+                batch = []
+                deadline = None
+
+        # -------------------------------------------------------------------------------
+        # Drain Whatever is Still Queued
+        # -------------------------------------------------------------------------------
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        try:
+            query = urlencode({'db': self.database, 'precision': 'n'})
+            await self._post('/write?' + query, data='\n'.join(batch).encode('utf-8'))
+            self.written += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            self.logger.exception("Failed to write {0} score records to InfluxDB".format(len(batch)))
+
+    async def _post(self, path, data):
+        async with self._session.post(self.url + path, data=data) as response:
+            if response.status >= 300:
+                raise Exception("InfluxDB {0} returned {1}: {2}".format(path, response.status, await response.text()))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._session is not None:
+            await self._session.close()
+
+# -------------------------------------------------------------------------------
+# Bounded Executor for CPU-Bound predict Calls
+# -------------------------------------------------------------------------------
+def _process_model_run(payload):
+    return helper.model_run(payload, logger)
+
+class PredictExecutor:
+    def __init__(self, kind='thread', workers=None, max_waiting=64):
+        workers = workers or os.cpu_count()
+        if kind == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+            self._call = _process_model_run
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='predict')
+            self._call = lambda payload: helper.model_run(payload, logger)
+        self._kind = kind
+        self._workers = workers
+        self._slots = None
+        self._capacity = workers + max_waiting
+
+    # -------------------------------------------------------------------------------
+    # Process Workers Hold their Own Copy of the MOJO, so a Swap Starts Fresh Ones;
+    # calls already running on the old pool finish there
+    # -------------------------------------------------------------------------------
+    def recycle(self, *args):
+        if self._kind != 'process':
+            return
+        old, self._executor = self._executor, ProcessPoolExecutor(max_workers=self._workers)
+        old.shutdown(wait=False)
+
+    async def run(self, payload):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._capacity)
+        async with self._slots:
+            return await asyncio.get_event_loop().run_in_executor(self._executor, self._call, payload)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+# -------------------------------------------------------------------------------
+# ASGI Application
+# -------------------------------------------------------------------------------
+class HousingModelApp:
+    def __init__(self):
+        self.registry = get_registry(os.environ.get('MOJO_PATH', MOJO_DIRECTORY), logging.getLogger('registry'))
+        self.executor = PredictExecutor(
+            kind=os.environ.get('SCORING_EXECUTOR', 'thread'),
+            workers=int(os.environ.get('SCORING_EXECUTOR_WORKERS', 0)) or None,
+            max_waiting=int(os.environ.get('SCORING_EXECUTOR_QUEUE', 64))
+        )
+        self.registry.on_swap(self.executor.recycle)
+        self.validate = compile_validator(model_input)
+        self.writer = AsyncScoreWriter(
+            host=os.environ.get('INFLUXDB_HOST', 'localhost'),
+            port=int(os.environ.get('INFLUXDB_PORT', 8086)),
+            username=os.environ.get('INFLUXDB_USERNAME', 'root'),
+            password=os.environ.get('INFLUXDB_PASSWORD', 'root'),
+            database=os.environ.get('INFLUXDB_DATABASE', 'housing'),
+            max_queue=int(os.environ.get('INFLUX_QUEUE_SIZE', 10000)),
+            batch_size=int(os.environ.get('INFLUX_BATCH_SIZE', 500)),
+            flush_interval=float(os.environ.get('INFLUX_FLUSH_INTERVAL', 1.0))
+        )
+        metrics.register_collector('scoring_writer', self.writer.metrics, AsyncScoreWriter.COUNTERS)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+
+        route = (scope['method'], scope['path'].rstrip('/'))
+
+        if route == ('GET', '/ping'):
+            ping = {"status":"Connection Successful"}
+            await self.respond(send, 200, json.dumps(ping))
+        elif route == ('POST', '/score'):
+            await self.score(receive, send)
+        elif route == ('GET', '/metrics'):
+            await self.send_body(send, 200, metrics.render().encode('utf-8'), b'text/plain; version=0.0.4')
+        else:
+            await self.respond(send, 404, {"message": "Not Found"})
+
+    # -------------------------------------------------------------------------------
+    # Startup / Shutdown
+    # -------------------------------------------------------------------------------
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                preload('datatable')
+                await asyncio.get_event_loop().run_in_executor(None, self.registry.load)
+                self.registry.watch()
+                await self.writer.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.writer.close()
+                self.executor.shutdown()
+                self.registry.stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # -------------------------------------------------------------------------------
+    # POST Method: Score
+    # -------------------------------------------------------------------------------
+    async def score(self, receive, send):
+
+        # -------------------------------------------------------------------------------
+        # Initialize Variables
+        # -------------------------------------------------------------------------------
+        influx_measurement = 'sale_prices'
+
+        body = b''
+        more = True
+        while more:
+            message = await receive()
+            body += message.get('body', b'')
+            more = message.get('more_body', False)
+
+        try:
+            payload = loads(body)
+        except ValueError as e:
+            await self.respond(send, 400, {"message": "Invalid JSON: {0}".format(e)})
+            return
+
+        errors = self.validate(payload)
+        if errors:
+            await self.respond(send, 400, {"message": "Input payload validation failed", "errors": errors})
+            return
+
+        # -------------------------------------------------------------------------------
+        # RETURN MOJO Scores from the Executor
+        # -------------------------------------------------------------------------------
+        scores = await self.executor.run(payload)
+
+        # -------------------------------------------------------------------------------
+        # Queue for InfluxDB; the async writer flushes in batches
+        # -------------------------------------------------------------------------------
+        self.writer.submit(helper.create_scores_payload(influx_measurement, scores, payload))
+
+        # -------------------------------------------------------------------------------
+        # Return Scores in the housing_model_output Shape
+        # -------------------------------------------------------------------------------
+        prices = scores.get('SALE PRICE')
+        await self.respond(send, 200, {"SALE PRICE": None if prices is None else [None if v is None else float(v) for v in prices]})
+
+    async def respond(self, send, status, body):
+        await self.send_body(send, status, json.dumps(body).encode('utf-8'), b'application/json')
+
+    async def send_body(self, send, status, data, content_type):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', content_type), (b'content-length', str(len(data)).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': data})
+
+application = HousingModelApp()
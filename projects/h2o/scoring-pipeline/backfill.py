@@ -0,0 +1,175 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+from .registry import ModelRegistry, MOJO_DIRECTORY
+from . import helper
+import multiprocessing
+import datetime
+import logging
+import json
+import time
+import os
+
+# -------------------------------------------------------------------------------
+# BACKFILL
+# - add_arguments(parser)
+# - backfill(start, end, model_path, version, source, target, window, workers,
+#            chunk_size, checkpoint, resume, logger)
+# -------------------------------------------------------------------------------
+
+def add_arguments(parser):
+    parser.add_argument('start', type=_parse_time, help='First request time to re-score (YYYY-MM-DDTHH:MM:SSZ)')
+    parser.add_argument('end', nargs='?', type=_parse_time, default=None, help='Re-score requests before this time (default: now)')
+    parser.add_argument('--model', default=os.environ.get('MOJO_PATH', MOJO_DIRECTORY), help='Pipeline.MOJO to re-score with')
+    parser.add_argument('--version', default=None, help='Version tag written with each prediction (default: the MOJO directory name)')
+    parser.add_argument('--source', default='sale_prices', help='Measurement holding the scored requests')
+    parser.add_argument('--target', default='sale_prices_backfill', help='Measurement the new predictions are written to')
+    parser.add_argument('--window-minutes', dest='window', type=float, default=60.0, help='Span of history each task re-scores')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes, each loading the MOJO once')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Rows read from InfluxDB and written back at a time')
+    parser.add_argument('--checkpoint', default=None, help='File recording completed windows (default: .backfill-<target>-<version>.json)')
+    parser.add_argument('--no-resume', dest='resume', action='store_false', help='Discard windows completed by a previous run')
+
+def _parse_time(value):
+    moment = datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=datetime.timezone.utc)
+    return int(moment.timestamp()) * 1000000000
+
+def backfill(start, end=None, model_path=MOJO_DIRECTORY, version=None, source='sale_prices', target='sale_prices_backfill',
+             window=60.0, workers=None, chunk_size=10000, checkpoint=None, resume=True, logger=None):
+    logger = logger or logging.getLogger('backfill')
+    version = version or os.path.basename(os.path.dirname(os.path.abspath(model_path))) or 'backfill'
+    checkpoint = checkpoint or '.backfill-{0}-{1}.json'.format(target, version)
+    step = int(window * 60 * 1000000000)
+    plan = {'source': source, 'target': target, 'version': version, 'start': start, 'step': step}
+
+    # -------------------------------------------------------------------------------
+    # Resume a Checkpoint Written for the Same Backfill; without an explicit end,
+    # the end the interrupted run resolved to "now" is reused
+    # -------------------------------------------------------------------------------
+    state = None
+    if resume and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            state = json.load(f)
+        saved = dict(state.get('plan', {}))
+        saved_end = saved.pop('end', None)
+        if saved != plan or (end is not None and end != saved_end):
+            logger.warning("Ignoring {0}; it was written for a different backfill".format(checkpoint))
+            state = None
+        else:
+            end = saved_end
+
+    end = end or int(time.time()) * 1000000000
+    plan['end'] = end
+
+    # -------------------------------------------------------------------------------
+    # Plan Time Windows; completed windows are recorded in the checkpoint file
+    # -------------------------------------------------------------------------------
+    windows = [(begin, min(begin + step, end)) for begin in range(start, end, step)]
+    done = set(state['done']) if state is not None else set()
+
+    pending = [w for w in windows if w[0] not in done]
+    logger.info("Backfilling {0} into {1} as {2}: {3} windows, {4} already complete".format(
+        source, target, version, len(windows), len(windows) - len(pending)))
+
+    # -------------------------------------------------------------------------------
+    # Fan Windows out across the Process Pool; each worker streams its window from
+    # InfluxDB a chunk at a time, so memory stays bounded by chunk_size
+    # -------------------------------------------------------------------------------
+    started = time.monotonic()
+    rows = 0
+
+    if pending:
+        pool = multiprocessing.Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(model_path, version, source, target, chunk_size)
+        )
+        try:
+            for begin, count in pool.imap_unordered(_backfill_window, pending):
+                rows += count
+                done.add(begin)
+                _save_checkpoint(checkpoint, plan, done)
+                elapsed = time.monotonic() - started
+                logger.info("Window {0} complete ({1}/{2}), {3} rows at {4:.0f} rows/sec".format(
+                    _format_time(begin), len(done), len(windows), rows, rows / elapsed if elapsed else 0))
+        finally:
+            pool.close()
+            pool.join()
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    logger.info("Backfilled {0} rows in {1:.1f}s".format(rows, time.monotonic() - started))
+
+def _save_checkpoint(path, plan, done):
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'plan': plan, 'done': sorted(done)}, f)
+    os.replace(path + '.tmp', path)
+
+def _format_time(nanoseconds):
+    return datetime.datetime.utcfromtimestamp(nanoseconds // 1000000000).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+# -------------------------------------------------------------------------------
+# Worker Process: load the MOJO and connect to InfluxDB once, then re-score
+# windows by start time
+# -------------------------------------------------------------------------------
+_worker = {}
+
+def _init_worker(model_path, version, source, target, chunk_size):
+    from influxdb import InfluxDBClient
+
+    registry = ModelRegistry(model_path)
+    registry.load()
+
+    _worker['registry'] = registry
+    _worker['client'] = InfluxDBClient(
+        host=os.environ.get('INFLUXDB_HOST', 'localhost'),
+        port=int(os.environ.get('INFLUXDB_PORT', 8086)),
+        username=os.environ.get('INFLUXDB_USERNAME', 'root'),
+        password=os.environ.get('INFLUXDB_PASSWORD', 'root'),
+        database=os.environ.get('INFLUXDB_DATABASE', 'housing')
+    )
+    _worker['keys'] = [name.replace('_', ' ') for name, stype in helper.input_schema()]
+    _worker['logger'] = logging.getLogger('backfill')
+    _worker.update(version=version, source=source, target=target, chunk_size=chunk_size)
+
+def _backfill_window(window):
+    begin, end = window
+    client = _worker['client']
+    keys = _worker['keys']
+    count = 0
+
+    # -------------------------------------------------------------------------------
+    # Requests Answered by the Service; shadow records repeat the same inputs, and
+    # pooled records belong to other models
+    # -------------------------------------------------------------------------------
+    query = 'SELECT * FROM "{0}" WHERE time >= {1} AND time < {2} AND "role" != \'shadow\' AND "role" != \'pooled\''.format(
+        _worker['source'].replace('"', '\\"'), begin, end)
+
+    for result in client.query(query, epoch='ns', chunked=True, chunk_size=_worker['chunk_size']):
+        points = list(result.get_points())
+        if not points:
+            continue
+
+        rows = [{key: point.get(key) for key in keys} for point in points]
+        scores = helper.model_run(rows, _worker['logger'], _worker['registry'])
+
+        # -------------------------------------------------------------------------------
+        # Keep the Original Request Time so Old and New Predictions Line Up
+        # -------------------------------------------------------------------------------
+        deltas = [
+            None if new is None or point.get('SALE PRICE') is None else new - point['SALE PRICE']
+            for new, point in zip(scores['SALE PRICE'], points)
+        ]
+        data = helper.create_scores_payload(
+            _worker['target'],
+            scores,
+            rows,
+            tags={'version': _worker['version'], 'role': 'backfill'},
+            extra={'SALE PRICE DELTA': deltas},
+            times=[point['time'] for point in points]
+        )
+        client.write_points(data, time_precision='n', protocol='line', batch_size=_worker['chunk_size'])
+        count += len(points)
+
+    return begin, count
@@ -0,0 +1,194 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+from .registry import ModelRegistry, MOJO_DIRECTORY
+from .lazy import lazy_import
+from . import helper
+import multiprocessing
+import logging
+import shutil
+import json
+import time
+import os
+
+datatable = lazy_import('datatable')
+
+# -------------------------------------------------------------------------------
+# BATCH SCORING
+# - add_arguments(parser)
+# - score_file(input_path, output_path, model_path, chunk_rows, workers, resume, logger)
+# -------------------------------------------------------------------------------
+
+def add_arguments(parser):
+    parser.add_argument('input', help='CSV or Parquet file of housing_model_input rows')
+    parser.add_argument('output', help='CSV file to write SALE PRICE predictions to, in input order')
+    parser.add_argument('--model', default=os.environ.get('MOJO_PATH', MOJO_DIRECTORY), help='Pipeline.MOJO to score with')
+    parser.add_argument('--chunk-rows', type=int, default=100000, help='Rows per chunk (CSV only; Parquet uses row groups)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes, each loading the MOJO once')
+    parser.add_argument('--no-resume', dest='resume', action='store_false', help='Discard chunks completed by a previous run')
+
+def score_file(input_path, output_path, model_path=MOJO_DIRECTORY, chunk_rows=100000, workers=None, resume=True, logger=None):
+    logger = logger or logging.getLogger('batch')
+    parquet = input_path.endswith(('.parquet', '.pq'))
+
+    # -------------------------------------------------------------------------------
+    # Plan Chunks; CSV chunks are byte ranges that start on a record boundary, so
+    # quoted newlines cannot shift them
+    # -------------------------------------------------------------------------------
+    if parquet:
+        import pyarrow.parquet
+        names = None
+        ranges = None
+        chunks = pyarrow.parquet.ParquetFile(input_path).num_row_groups
+    else:
+        names = datatable.fread(input_path, max_nrows=0).names
+        ranges = _plan_chunks(input_path, chunk_rows)
+        chunks = len(ranges)
+
+    # -------------------------------------------------------------------------------
+    # Completed Chunks live in <output>.parts and survive restarts; its manifest
+    # stops a resume against a changed input or a different chunk size
+    # -------------------------------------------------------------------------------
+    parts = output_path + '.parts'
+    if not resume:
+        shutil.rmtree(parts, ignore_errors=True)
+    os.makedirs(parts, exist_ok=True)
+
+    stat = os.stat(input_path)
+    manifest = {'input': os.path.abspath(input_path), 'size': stat.st_size, 'mtime': stat.st_mtime, 'chunk_rows': chunk_rows}
+    manifest_path = os.path.join(parts, 'manifest.json')
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            if json.load(f) != manifest:
+                raise ValueError("{0} was written for a different input or --chunk-rows; rerun with --no-resume".format(parts))
+    elif os.listdir(parts):
+        raise ValueError("{0} has no manifest; rerun with --no-resume".format(parts))
+    else:
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    pending = [index for index in range(chunks) if not os.path.exists(_part_path(parts, index))]
+    logger.info("Scoring {0}: {1} chunks, {2} already complete".format(input_path, chunks, chunks - len(pending)))
+
+    # -------------------------------------------------------------------------------
+    # Fan Chunks out across the Process Pool
+    # -------------------------------------------------------------------------------
+    started = time.monotonic()
+    rows = 0
+    done = chunks - len(pending)
+
+    if pending:
+        pool = multiprocessing.Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(model_path, input_path, names, ranges, parquet, parts)
+        )
+        try:
+            for index, count in pool.imap_unordered(_score_chunk, pending):
+                rows += count
+                done += 1
+                elapsed = time.monotonic() - started
+                logger.info("Chunk {0} complete ({1}/{2}), {3} rows at {4:.0f} rows/sec".format(
+                    index, done, chunks, rows, rows / elapsed if elapsed else 0))
+        finally:
+            pool.close()
+            pool.join()
+
+    # -------------------------------------------------------------------------------
+    # Concatenate Parts in Input Order
+    # -------------------------------------------------------------------------------
+    with open(output_path, 'wb') as output:
+        for index in range(chunks):
+            with open(_part_path(parts, index), 'rb') as part:
+                if index > 0:
+                    part.readline()
+                shutil.copyfileobj(part, output)
+
+    shutil.rmtree(parts, ignore_errors=True)
+    logger.info("Wrote {0} in {1:.1f}s".format(output_path, time.monotonic() - started))
+
+def _plan_chunks(path, chunk_rows):
+
+    # -------------------------------------------------------------------------------
+    # One Pass over the File; a newline ends a record only outside quotes, and an
+    # escaped quote ("") toggles twice, so counting quotes is enough
+    # -------------------------------------------------------------------------------
+    offsets = []
+    boundary = 1
+    records = 0
+    quoted = False
+    position = 0
+
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            for index, part in enumerate(block.split(b'"')):
+                if index:
+                    quoted = not quoted
+                    position += 1
+                if not quoted:
+                    newlines = part.count(b'\n')
+                    if records + newlines < boundary:
+                        records += newlines
+                    else:
+                        start = part.find(b'\n') + 1
+                        while start:
+                            records += 1
+                            if records == boundary:
+                                offsets.append(position + start)
+                                boundary += chunk_rows
+                            start = part.find(b'\n', start) + 1
+                position += len(part)
+
+    # -------------------------------------------------------------------------------
+    # Chunk i holds the bytes from its first record up to the next chunk's
+    # -------------------------------------------------------------------------------
+    return [(start, end) for start, end in zip(offsets, offsets[1:] + [position]) if start < end]
+
+def _part_path(parts, index):
+    return os.path.join(parts, '{0:06d}.csv'.format(index))
+
+# -------------------------------------------------------------------------------
+# Worker Process: load the MOJO once, then score chunks by index
+# -------------------------------------------------------------------------------
+_worker = {}
+
+def _init_worker(model_path, input_path, names, ranges, parquet, parts):
+    _worker['mojo'] = ModelRegistry(model_path).load()
+    _worker.update(input_path=input_path, names=names, ranges=ranges, parquet=parquet, parts=parts)
+
+def _score_chunk(index):
+    if _worker['parquet']:
+        import pyarrow.parquet
+        table = pyarrow.parquet.ParquetFile(_worker['input_path']).read_row_group(index)
+        raw = datatable.Frame(table.to_pandas())
+    else:
+
+        # -------------------------------------------------------------------------------
+        # fread has no byte-offset source, so the chunk's bytes are read and parsed
+        # from memory; they are at most one chunk
+        # -------------------------------------------------------------------------------
+        start, end = _worker['ranges'][index]
+        with open(_worker['input_path'], 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        raw = datatable.fread(text=data.decode('utf-8'), header=False, columns=_worker['names'])
+
+    # -------------------------------------------------------------------------------
+    # Type Every Chunk from the Declared Schema, as /score does, rather than by
+    # what fread guessed from this chunk's values
+    # -------------------------------------------------------------------------------
+    frame = helper.build_frame(helper.resolve_columns(raw))
+
+    scores = _worker['mojo'].predict(frame)
+
+    # -------------------------------------------------------------------------------
+    # Write then Rename, so a Part only Exists once its Chunk is Complete
+    # -------------------------------------------------------------------------------
+    path = _part_path(_worker['parts'], index)
+    scores.to_csv(path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+    return index, frame.nrows
@@ -0,0 +1,109 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+from concurrent.futures import Future
+import threading
+import logging
+import queue
+import time
+import os
+
+# -------------------------------------------------------------------------------
+# MICRO BATCHER
+# - MicroBatcher(predict, max_wait, max_batch_rows)
+# -------------------------------------------------------------------------------
+
+class MicroBatcher:
+    def __init__(self, predict, max_wait=0.005, max_batch_rows=256, logger=None):
+        self.predict = predict
+        self.max_wait = max_wait
+        self.max_batch_rows = max_batch_rows
+        self.logger = logger or logging.getLogger('batcher')
+        self._queue = None
+        self._carry = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------------------------
+    # Score a Payload; blocks until the batch holding its rows has been predicted.
+    # Frames decoded from columnar requests are already one batch and skip the queue
+    # -------------------------------------------------------------------------------
+    def run(self, payload, logger=None):
+        if type(payload) not in (list, dict):
+            return self.predict(payload, logger or self.logger)
+
+        rows = payload if type(payload) == list else [payload]
+        future = Future()
+        self._start()
+        self._queue.put((rows, future))
+        return future.result()
+
+    # -------------------------------------------------------------------------------
+    # Threads do not survive fork(), so the batching thread starts per process
+    # -------------------------------------------------------------------------------
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._carry = None
+                threading.Thread(target=self._run, name='micro-batcher', daemon=True).start()
+                self._pid = os.getpid()
+
+    # -------------------------------------------------------------------------------
+    # Collect Requests until the Window Closes or the Batch is Full
+    # -------------------------------------------------------------------------------
+    def _run(self):
+        while True:
+            if self._carry is not None:
+                pending, self._carry = [self._carry], None
+            else:
+                pending = [self._queue.get()]
+
+            count = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+
+            while count < self.max_batch_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if count + len(item[0]) > self.max_batch_rows:
+                    self._carry = item
+                    break
+                pending.append(item)
+                count += len(item[0])
+
+            self._score(pending, count)
+
+    def _score(self, pending, count):
+
+        # -------------------------------------------------------------------------------
+        # One Frame and One predict over the Stacked Rows
+        # -------------------------------------------------------------------------------
+        rows = []
+        for payload, future in pending:
+            rows.extend(payload)
+
+        try:
+            scores = self.predict(rows, self.logger)
+        except Exception as e:
+            for payload, future in pending:
+                future.set_exception(e)
+            return
+
+        self.logger.debug("Scored {0} requests in one batch of {1} rows".format(len(pending), count))
+
+        # -------------------------------------------------------------------------------
+        # Hand Each Caller Only its Own Rows
+        # -------------------------------------------------------------------------------
+        start = 0
+        for payload, future in pending:
+            end = start + len(payload)
+            future.set_result({column: values[start:end] for column, values in scores.items()})
+            start = end
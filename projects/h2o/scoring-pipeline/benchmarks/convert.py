@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# Name: convert.py
+# Purpose: Benchmark payload-to-Frame conversion against the pandas path
+# Usage: python -m app.benchmarks.convert [--rows 1 100 10000] [--repeat 20]
+# -------------------------------------------------------------------------------
+
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+from app import helper
+from app.benchmarks.stubs import make_payload
+import datatable
+import argparse
+import timeit
+import pandas
+
+# -------------------------------------------------------------------------------
+# Previous Conversion: payload -> pandas.DataFrame -> datatable.Frame
+# -------------------------------------------------------------------------------
+def convert_with_pandas(payload):
+    if(type(payload) == list):
+        df = pandas.DataFrame(payload)
+    else:
+        df = pandas.DataFrame(payload, index=[0])
+    return datatable.Frame(df)
+
+# -------------------------------------------------------------------------------
+# Console Entry Point
+# -------------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark convert_to_datatable')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1, 100, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print('{0:>8} {1:>14} {2:>14} {3:>8}'.format('rows', 'pandas (ms)', 'columnar (ms)', 'speedup'))
+
+    for rows in args.rows:
+        payload = make_payload(rows)
+        legacy = min(timeit.repeat(lambda: convert_with_pandas(payload), number=1, repeat=args.repeat))
+        columnar = min(timeit.repeat(lambda: helper.convert_to_datatable(payload), number=1, repeat=args.repeat))
+        print('{0:>8} {1:>14.3f} {2:>14.3f} {3:>7.1f}x'.format(rows, legacy * 1000, columnar * 1000, legacy / columnar))
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# Name: load.py
+# Purpose: Load test /score and report p50/p95/p99 latency and rows/sec
+# Usage: python -m app.benchmarks.load [--url URL] [--concurrency 8]
+#                                      [--batch-sizes 1 10 100] [--duration 10]
+#                                      [--shape list|object] [--distinct 64]
+#                                      [--output results.json]
+#                                      [--baseline previous.json] [--tolerance 0.1]
+#
+# Without --url the service is started in-process with the stub MOJO and a
+# stub InfluxDB, so results only depend on the code under test. Drift sketches
+# are off unless SCORING_DRIFT_INTERVAL is set, the prediction cache runs with
+# its defaults, and the SCORING_* settings are kept in meta.
+# -------------------------------------------------------------------------------
+
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+from app.benchmarks.stubs import StubModel, StubInflux, make_payload
+from urllib.parse import urlparse
+import http.client
+import threading
+import importlib
+import platform
+import argparse
+import logging
+import json
+import time
+import sys
+import os
+
+# -------------------------------------------------------------------------------
+# Start the Service In-Process against the Stubs
+# -------------------------------------------------------------------------------
+def start_local_service(fixed_cost, row_cost):
+    from werkzeug.serving import make_server
+
+    influx = StubInflux().start()
+    os.environ['INFLUXDB_HOST'] = influx.host
+    os.environ['INFLUXDB_PORT'] = str(influx.port)
+
+    # -------------------------------------------------------------------------------
+    # Measure Scoring, not the Drift Sketches, unless asked to; the service reads
+    # this once on import
+    # -------------------------------------------------------------------------------
+    os.environ.setdefault('SCORING_DRIFT_INTERVAL', '0')
+
+    service = importlib.import_module('app.__main__')
+    logging.getLogger().setLevel(logging.WARNING)
+
+    service.model_registry.loader = lambda path: StubModel(path, fixed_cost, row_cost)
+    service.model_registry.load()
+
+    server = make_server('127.0.0.1', 0, service.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='benchmark-server', daemon=True).start()
+
+    return 'http://127.0.0.1:{0}/score'.format(server.server_port), server, influx
+
+# -------------------------------------------------------------------------------
+# Drive /score with a Fixed Number of Keep-Alive Connections
+# -------------------------------------------------------------------------------
+def run_load(url, batch_size, concurrency, duration, shape, distinct):
+    target = urlparse(url)
+    bodies = []
+    for seed in range(distinct):
+        rows = make_payload(batch_size, seed=seed)
+        payload = rows[0] if shape == 'object' and batch_size == 1 else rows
+        bodies.append(json.dumps(payload).encode('utf-8'))
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(offset):
+        connection = http.client.HTTPConnection(target.hostname, target.port or 80)
+        local, failed, count = [], 0, offset
+        while time.monotonic() < deadline:
+            body = bodies[count % len(bodies)]
+            count += 1
+            start = time.perf_counter()
+            try:
+                connection.request('POST', target.path or '/score', body, {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection(target.hostname, target.port or 80)
+                continue
+            local.append(time.perf_counter() - start)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        'batch_size': batch_size,
+        'concurrency': concurrency,
+        'shape': shape,
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'p50_ms': percentile(latencies, 50) * 1000.0,
+        'p95_ms': percentile(latencies, 95) * 1000.0,
+        'p99_ms': percentile(latencies, 99) * 1000.0,
+        'requests_per_sec': len(latencies) / elapsed,
+        'rows_per_sec': len(latencies) * batch_size / elapsed
+    }
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    index = max(int(round(pct / 100.0 * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+# -------------------------------------------------------------------------------
+# Compare against a Previous Run
+# -------------------------------------------------------------------------------
+def compare(results, baseline, tolerance):
+    previous = {(r['batch_size'], r['concurrency'], r['shape']): r for r in baseline['results']}
+    regressions = []
+
+    for result in results['results']:
+        before = previous.get((result['batch_size'], result['concurrency'], result['shape']))
+        if before is None:
+            continue
+        if result['p99_ms'] > before['p99_ms'] * (1 + tolerance):
+            regressions.append('batch {0}: p99 {1:.2f}ms > {2:.2f}ms'.format(result['batch_size'], result['p99_ms'], before['p99_ms']))
+        if result['rows_per_sec'] < before['rows_per_sec'] * (1 - tolerance):
+            regressions.append('batch {0}: {1:.0f} rows/sec < {2:.0f} rows/sec'.format(result['batch_size'], result['rows_per_sec'], before['rows_per_sec']))
+
+    return regressions
+
+# -------------------------------------------------------------------------------
+# Console Entry Point
+# -------------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the housing model API')
+    parser.add_argument('--url', help='Score endpoint of a running service (default: start one with stubs)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per batch size')
+    parser.add_argument('--shape', choices=['list', 'object'], default='list', help='Send single rows as a JSON list or a bare object')
+    parser.add_argument('--distinct', type=int, default=64, help='Distinct payloads per batch size')
+    parser.add_argument('--stub-fixed-ms', type=float, default=0.5, help='Stub predict cost per call')
+    parser.add_argument('--stub-row-us', type=float, default=10.0, help='Stub predict cost per row')
+    parser.add_argument('--output', help='Write results as JSON')
+    parser.add_argument('--baseline', help='Previous results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed relative regression')
+    args = parser.parse_args()
+
+    url = args.url
+    if url is None:
+        url, server, influx = start_local_service(args.stub_fixed_ms / 1000.0, args.stub_row_us / 1000000.0)
+
+    results = {
+        'meta': {
+            'url': args.url or 'local-stub',
+            'python': platform.python_version(),
+            'duration': args.duration,
+            'stub_fixed_ms': args.stub_fixed_ms,
+            'stub_row_us': args.stub_row_us,
+            'settings': {name: value for name, value in sorted(os.environ.items()) if name.startswith('SCORING_')},
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        },
+        'results': []
+    }
+
+    print('{0:>6} {1:>9} {2:>9} {3:>9} {4:>9} {5:>12} {6:>7}'.format('batch', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'rows/s', 'errors'))
+
+    for batch_size in args.batch_sizes:
+        result = run_load(url, batch_size, args.concurrency, args.duration, args.shape, args.distinct)
+        results['results'].append(result)
+        print('{batch_size:>6} {p50_ms:>9.2f} {p95_ms:>9.2f} {p99_ms:>9.2f} {requests_per_sec:>9.1f} {rows_per_sec:>12.0f} {errors:>7}'.format(**result))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,104 @@
+# -------------------------------------------------------------------------------
+# Name: stubs.py
+# Purpose: Deterministic stand-ins for daimojo.model and InfluxDB used by the
+#          benchmarks, so runs are reproducible without a license or a database
+# -------------------------------------------------------------------------------
+
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+import threading
+import datatable
+import random
+import time
+import zlib
+
+# -------------------------------------------------------------------------------
+# Synthetic housing_model_input Rows
+# -------------------------------------------------------------------------------
+def make_payload(rows, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            'BOROUGH': rng.randint(1, 5),
+            'NEIGHBORHOOD': rng.choice(['ALPHABET CITY', 'CHELSEA', 'HARLEM-CENTRAL', 'SOHO']),
+            'BUILDING_CLASS_CATEGORY': rng.choice(['01 ONE FAMILY DWELLINGS', '07 RENTALS - WALKUP APARTMENTS']),
+            'COMMERCIAL_UNITS': rng.randint(0, 3),
+            'TOTAL_UNITS': rng.randint(1, 40),
+            'LAND_SQUARE_FEET': rng.choice([rng.randint(500, 20000), '-']),
+            'GROSS_SQUARE_FEET': rng.choice([rng.randint(500, 40000), '-']),
+            'YEAR_BUILT': rng.randint(1880, 2019),
+            'BUILDING_CLASS_AT_TIME_OF_SALE': rng.choice(['A1', 'C4', 'D4', 'R4'])
+        }
+        for _ in range(rows)
+    ]
+
+# -------------------------------------------------------------------------------
+# Stub Pipeline.MOJO: same inputs always give the same SALE PRICE
+# - fixed_cost / row_cost simulate predict time in seconds
+# -------------------------------------------------------------------------------
+class StubModel:
+    def __init__(self, path=None, fixed_cost=0.0005, row_cost=0.00001):
+        self.path = path
+        self.fixed_cost = fixed_cost
+        self.row_cost = row_cost
+
+    def predict(self, frame):
+        columns = frame.to_list()
+        prices = []
+        for row in zip(*columns):
+            digest = zlib.crc32(repr(row).encode('utf-8'))
+            prices.append(100000.0 + (digest % 900000))
+
+        time.sleep(self.fixed_cost + self.row_cost * frame.nrows)
+        return datatable.Frame({'SALE PRICE': prices})
+
+# -------------------------------------------------------------------------------
+# Stub InfluxDB: accepts /ping, /query and /write and counts written lines
+# -------------------------------------------------------------------------------
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class StubInflux:
+    def __init__(self, host='127.0.0.1', port=0, write_latency=0.0):
+        self.lines = 0
+        self.writes = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self._reply(204 if self.path.startswith('/ping') else 200, b'{"results":[{"statement_id":0}]}')
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.path.startswith('/write'):
+                    time.sleep(write_latency)
+                    stub.writes += 1
+                    stub.lines += body.count(b'\n') + (1 if body and not body.endswith(b'\n') else 0)
+                    self._reply(204, b'')
+                else:
+                    self._reply(200, b'{"results":[{"statement_id":0}]}')
+
+            def _reply(self, status, body):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _ThreadingHTTPServer((host, port), Handler)
+        self.host, self.port = self.server.server_address
+        self._thread = threading.Thread(target=self.server.serve_forever, name='stub-influx', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
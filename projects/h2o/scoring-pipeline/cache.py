@@ -0,0 +1,194 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+from collections import OrderedDict
+from .helper import resolve_columns, coerce_column
+import threading
+import hashlib
+import logging
+import json
+import time
+
+# -------------------------------------------------------------------------------
+# PREDICTION CACHE
+# - PredictionCache(max_entries, ttl, backend)
+# - RedisBackend(url, ttl)
+# - row_keys(rows, version, digest)
+# A failing shared backend is logged, counted and treated as a miss
+# -------------------------------------------------------------------------------
+
+def row_keys(rows, version, digest=True):
+
+    # -------------------------------------------------------------------------------
+    # Key Each Row as the Frame Builder Sees it: resolved column names and coerced
+    # values, where a missing value and None are the same; the model version is
+    # part of the key
+    # -------------------------------------------------------------------------------
+    columns = [(name, coerce_column(values, stype)) for name, stype, values in resolve_columns(rows)]
+    names = [name for name, values in columns]
+    keys = [
+        (version,) + tuple((name, value) for name, value in zip(names, values) if value is not None)
+        for values in zip(*[values for name, values in columns])
+    ]
+
+    # -------------------------------------------------------------------------------
+    # Process-Local Keys stay Tuples; only keys shared with other processes are
+    # hashed into stable strings
+    # -------------------------------------------------------------------------------
+    if not digest:
+        return keys
+
+    return [
+        hashlib.sha1(json.dumps([key[0], sorted(key[1:])], separators=(',', ':'), default=str).encode('utf-8')).hexdigest()
+        for key in keys
+    ]
+
+class PredictionCache:
+    COUNTERS = ('cache_hits', 'cache_misses', 'cache_evictions', 'cache_shared_hits', 'cache_backend_errors')
+
+    def __init__(self, max_entries=10000, ttl=3600.0, backend=None, logger=None, max_rows=100):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.backend = backend
+        self.logger = logger or logging.getLogger('cache')
+        self.backend_errors = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared_hits = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------------------------
+    # Local LRU with TTL
+    # -------------------------------------------------------------------------------
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] < now:
+                    del self._entries[key]
+                    self.evictions += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[1]
+
+        # -------------------------------------------------------------------------------
+        # Fall Back to the Shared Backend for Local Misses
+        # -------------------------------------------------------------------------------
+        missing = [key for key in keys if key not in found]
+        if self.backend is not None and missing:
+            try:
+                shared = self.backend.get_many(missing)
+            except Exception:
+                shared = None
+                self.backend_errors += 1
+                self.logger.exception("Shared cache lookup failed; scoring {0} rows".format(len(missing)))
+            if shared:
+                self.shared_hits += len(shared)
+                self._store(shared, share=False)
+                found.update(shared)
+
+        return found
+
+    def set_many(self, values):
+        self._store(values, share=True)
+
+    def _store(self, values, share):
+        expires = time.monotonic() + self.ttl
+
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (expires, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        if share and self.backend is not None:
+            try:
+                self.backend.set_many(values)
+            except Exception:
+                self.backend_errors += 1
+                self.logger.exception("Failed to share {0} cached predictions".format(len(values)))
+
+    def clear(self, *args):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self):
+        return {
+            'cache_entries': len(self._entries),
+            'cache_hits': self.hits,
+            'cache_misses': self.misses,
+            'cache_evictions': self.evictions,
+            'cache_shared_hits': self.shared_hits,
+            'cache_backend_errors': self.backend_errors
+        }
+
+    # -------------------------------------------------------------------------------
+    # Wrap a model_run(payload, logger) Function; only the missed rows are scored.
+    # Large batches bypass the cache: keying them costs more than the model saves,
+    # and they would flush the LRU
+    # -------------------------------------------------------------------------------
+    def wrap(self, model_run, version):
+        def cached_model_run(payload, logger):
+            if type(payload) not in (list, dict):
+                return model_run(payload, logger)
+
+            rows = payload if type(payload) == list else [payload]
+            if len(rows) > self.max_rows:
+                return model_run(payload, logger)
+
+            tag = version()
+            keys = row_keys(rows, tag, self.backend is not None)
+            try:
+                found = self.get_many(keys)
+            except TypeError:
+                return model_run(payload, logger)
+
+            misses = [index for index, key in enumerate(keys) if key not in found]
+            self.hits += len(rows) - len(misses)
+            self.misses += len(misses)
+
+            if misses:
+                scores = model_run([rows[index] for index in misses], logger)
+                fresh = {}
+                for position, index in enumerate(misses):
+                    fresh[keys[index]] = {column: values[position] for column, values in scores.items()}
+                self.set_many(fresh)
+                found.update(fresh)
+
+            if not keys:
+                return model_run(payload, logger)
+
+            return {column: [found[key][column] for key in keys] for column in found[keys[0]]}
+
+        return cached_model_run
+
+# -------------------------------------------------------------------------------
+# Shared Backend for Pre-Forked Workers (optional, requires redis)
+# -------------------------------------------------------------------------------
+class RedisBackend:
+    def __init__(self, url, ttl=3600.0, prefix='scoring:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get_many(self, keys):
+        values = self.client.mget([self.prefix + key for key in keys])
+        return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, values):
+        pipeline = self.client.pipeline(transaction=False)
+        for key, value in values.items():
+            pipeline.setex(self.prefix + key, self.ttl, json.dumps(value))
+        pipeline.execute()
@@ -0,0 +1,76 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+from .helper import input_schema
+from .lazy import lazy_import
+
+datatable = lazy_import('datatable')
+
+# -------------------------------------------------------------------------------
+# COLUMNAR REQUESTS AND RESPONSES (optional, requires pyarrow)
+# - ARROW_STREAM: Content-Type / Accept for Arrow IPC streams
+# - decode_frame(data, schema) -> datatable.Frame with the declared column types
+# - encode_scores(scores)      -> Arrow IPC stream holding SALE PRICE as float64
+# -------------------------------------------------------------------------------
+
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+
+def decode_frame(data, schema=None):
+    import pyarrow.ipc
+
+    try:
+        table = pyarrow.ipc.open_stream(pyarrow.py_buffer(data)).read_all()
+    except pyarrow.ArrowInvalid as e:
+        raise ValueError("Invalid Arrow IPC stream: {0}".format(e))
+
+    # -------------------------------------------------------------------------------
+    # Resolve Column Names; batches may use the declared name or its spaced form,
+    # and the Frame uses the spaced name as resolve_columns does for JSON
+    # -------------------------------------------------------------------------------
+    frames = []
+    missing = []
+
+    for name, stype in schema or input_schema():
+        spaced = name.replace('_', ' ')
+        key = name if name in table.column_names else spaced
+        if key not in table.column_names:
+            missing.append(name)
+            continue
+
+        column = table.column(key)
+
+        # -------------------------------------------------------------------------------
+        # Numeric Columns Move as Buffers; strings still go through Python objects,
+        # since datatable cannot read Arrow string buffers directly
+        # -------------------------------------------------------------------------------
+        if stype is datatable.str32:
+            values = column.to_pylist()
+        else:
+            values = column.to_numpy() if column.null_count == 0 else column.to_pylist()
+
+        try:
+            frames.append(datatable.Frame(values, names=[spaced], stype=stype))
+        except (TypeError, ValueError) as e:
+            raise ValueError("Column '{0}' cannot be read as {1}: {2}".format(key, stype, e))
+
+    if missing:
+        raise ValueError("Missing columns: {0}".format(', '.join(missing)))
+
+    return datatable.cbind(*frames)
+
+def encode_scores(scores):
+    import pyarrow.ipc
+
+    # -------------------------------------------------------------------------------
+    # One Contiguous float64 Buffer per Score Column
+    # -------------------------------------------------------------------------------
+    names = sorted(scores)
+    arrays = [pyarrow.array(scores[name], type=pyarrow.float64()) for name in names]
+    batch = pyarrow.RecordBatch.from_arrays(arrays, names)
+
+    sink = pyarrow.BufferOutputStream()
+    writer = pyarrow.ipc.RecordBatchStreamWriter(sink, batch.schema)
+    writer.write_batch(batch)
+    writer.close()
+    return sink.getvalue().to_pybytes()
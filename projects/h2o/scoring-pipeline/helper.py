@@ -2,118 +2,347 @@
 # Library Imports
 # -------------------------------------------------------------------------------
 
-import daimojo.model
-import datatable
-import pandas
+from flask_restx import fields
+from .registry import get_registry
+from .schema import model_input
+from .lazy import lazy_import
+from . import metrics
+import threading
+import time
+
+datatable = lazy_import('datatable')
 
 # -------------------------------------------------------------------------------
 # HELPER FUNCTIONS
-# - model_run(payload)
-# - convert_to_datatable(payload)
-# - create_scores_payload(measurement, scores, payload)
+# - model_run(payload, logger, registry)
+# - deduplicate(columns) -> (unique columns, inverse)
+# - frame_schema(model)
+# - input_schema()
+# - warm_up(count, logger, registry)
+# - resolve_columns(payload, schema) -> [(name, stype, values)]
+# - convert_to_datatable(payload, schema)
+# - build_frame(columns)
+# - coerce_column(values, stype)
+# - create_scores_payload(measurement, scores, payload, tags, schema, extra, times)
+# - reserve_timestamps(count) -> range of unique nanosecond timestamps
+# - validate_integers(column)
 # - validate_integer(category)
+# - escape_key(key)
+# - escape_string(value)
+# - escape_newlines(value)
 # -------------------------------------------------------------------------------
  
-def model_run(payload, logger):
+def model_run(payload, logger, registry=None):
 
     logger.debug("Payload: {0}".format(payload))
     # -------------------------------------------------------------------------------
-    # Pipeline.MOJO Directory // NOT IN PROJECT
+    # Pipeline.MOJO loaded once per process by the model registry
     # -------------------------------------------------------------------------------
-    mojo_directory = "./lib/pipeline.mojo"
-    mojo = daimojo.model(mojo_directory)
+    mojo, version = (registry or get_registry()).current()
 
     # -------------------------------------------------------------------------------
-    # Return Datatable Dataframe using helper.py function
+    # Predict Each Distinct Row Once; Frames from columnar requests go straight
+    # to the model
     # -------------------------------------------------------------------------------
-    dt = convert_to_datatable(payload)
-        
+    if isinstance(payload, datatable.Frame):
+        dt, inverse = payload, None
+    else:
+        with metrics.stage('dedup'):
+            columns, inverse = deduplicate(resolve_columns(payload))
+        if inverse is not None:
+            metrics.observe_dedup(len(inverse), len(columns[0][2]))
+
+        # -------------------------------------------------------------------------------
+        # Return Datatable Dataframe using helper.py function
+        # -------------------------------------------------------------------------------
+        with metrics.stage('convert'):
+            dt = build_frame(columns)
+    metrics.observe_rows('predict', dt.nrows)
+
     # -------------------------------------------------------------------------------
-    # Return Scores
+    # Return Scores, Scattered back to Every Original Row Position
     # -------------------------------------------------------------------------------
-    scores = mojo.predict(dt)
-    logger.debug("Payload Score: {0}".format(scores.to_dict()))
-    return scores.to_dict()
+    with metrics.stage('predict'):
+        scores = mojo.predict(dt).to_dict()
+    if inverse is not None and dt.nrows < len(inverse):
+        scores = {name: [values[i] for i in inverse] for name, values in scores.items()}
+    logger.debug("Payload Score: {0}".format(scores))
+    return scores
 
-def convert_to_datatable(payload):
+def deduplicate(columns):
 
     # -------------------------------------------------------------------------------
-    # Convert API Payload to Pandas Dataframe
+    # Key Rows by their Values in Every Resolved Column the Frame is Built From;
+    # the dict keeps first-seen order, so inverse[i] is the unique row scoring
+    # position i
     # -------------------------------------------------------------------------------
+    if not columns or len(columns[0][2]) < 2:
+        return columns, None
 
-    if(type(payload) == list):
-        df = pandas.DataFrame(payload)
-    else: 
-        df = pandas.DataFrame(payload, index=[0])
-    
+    try:
+        positions = {}
+        inverse = [positions.setdefault(row, len(positions)) for row in zip(*[values for name, stype, values in columns])]
+    except TypeError:
+        return columns, None
+
+    if len(positions) == len(inverse):
+        return columns, inverse
+
+    first = []
+    for index, position in enumerate(inverse):
+        if position == len(first):
+            first.append(index)
+    return [(name, stype, [values[i] for i in first]) for name, stype, values in columns], inverse
+
+def warm_up(count, logger, registry=None):
+
+    # -------------------------------------------------------------------------------
+    # Synthetic Predictions so the First Real Request does not Pay Initialization;
+    # rows use the spaced column names real requests send
+    # -------------------------------------------------------------------------------
+    row = {}
+    for name, stype in input_schema():
+        row[name.replace('_', ' ')] = 0 if stype in (datatable.int32, datatable.float64) else ''
+
+    for _ in range(count):
+        model_run([row], logger, registry)
+
+def frame_schema(model):
+
+    # -------------------------------------------------------------------------------
+    # Map the Declared API Field Types to Datatable Column Types
+    # -------------------------------------------------------------------------------
+    schema = []
+
+    for name, field in model.items():
+        kind = field if isinstance(field, type) else type(field)
+
+        if issubclass(kind, fields.Integer):
+            stype = datatable.int32
+        elif issubclass(kind, (fields.Float, fields.Arbitrary)):
+            stype = datatable.float64
+        elif issubclass(kind, fields.Boolean):
+            stype = datatable.bool8
+        else:
+            stype = datatable.str32
+
+        schema.append((name, stype))
+
+    return schema
+
+_input_schema = None
+
+def input_schema():
+    global _input_schema
+    if _input_schema is None:
+        _input_schema = frame_schema(model_input)
+    return _input_schema
+
+def resolve_columns(payload, schema=None):
+
+    # -------------------------------------------------------------------------------
+    # Collect Keys from Every Row; rows rarely differ, so most payloads only compare
+    # each row's keys against the first
+    # -------------------------------------------------------------------------------
+
+    if isinstance(payload, datatable.Frame):
+        rows = None
+        found = dict(zip(payload.names, payload.to_list()))
+    else:
+        rows = payload if type(payload) == list else [payload]
+        first = rows[0].keys() if rows else {}.keys()
+        found = dict.fromkeys(first)
+        for row in rows:
+            if row.keys() != first:
+                found.update(dict.fromkeys(row))
+
+    # -------------------------------------------------------------------------------
+    # Resolve Column Keys; a declared name and its spaced form are one column, named
+    # the spaced way, and each row may use either spelling (the declared one wins,
+    # as in the validator)
+    # -------------------------------------------------------------------------------
+
+    columns = []
+
+    for name, stype in schema or input_schema():
+        spaced = name.replace('_', ' ')
+        keys = [key for key in ((spaced,) if spaced == name else (spaced, name)) if key in found]
+        if not keys:
+            continue
+
+        if rows is None:
+            values = found[keys[0]]
+        elif len(keys) == 1:
+            values = [row.get(keys[0]) for row in rows]
+        else:
+            values = [row[name] if name in row else row.get(spaced) for row in rows]
+
+        for key in keys:
+            del found[key]
+        columns.append((spaced, stype, values))
+
+    # -------------------------------------------------------------------------------
+    # Undeclared Keys keep their Spelling and are Left Untyped
+    # -------------------------------------------------------------------------------
+
+    for key, values in found.items():
+        columns.append((key, None, values if rows is None else [row.get(key) for row in rows]))
+
+    return columns
+
+def convert_to_datatable(payload, schema=None):
+
+    # -------------------------------------------------------------------------------
+    # Frames Decoded from Columnar Requests are Already Typed
     # -------------------------------------------------------------------------------
-    # Convert Pandas Dataframe to Datatables Dataframe
+
+    if isinstance(payload, datatable.Frame):
+        return payload
+
+    return build_frame(resolve_columns(payload, schema))
+
+def build_frame(columns):
+
+    # -------------------------------------------------------------------------------
+    # Build Typed Column Buffers Directly from the Resolved Columns
     # -------------------------------------------------------------------------------
 
-    dt = datatable.Frame(df)
+    frames = []
+
+    for key, stype, values in columns:
+        values = coerce_column(values, stype)
+
+        if stype is None:
+            frames.append(datatable.Frame(values, names=[key]))
+        else:
+            frames.append(datatable.Frame(values, names=[key], stype=stype))
 
     # -------------------------------------------------------------------------------
     # Return Datatable
     # -------------------------------------------------------------------------------
 
-    return dt
+    return datatable.cbind(*frames) if frames else datatable.Frame()
 
-def create_scores_payload(measurement, scores, payload):
+def coerce_column(values, stype):
 
     # -------------------------------------------------------------------------------
-    # Initialize Array to Build Scores Payload
+    # Convert Values to the Column Type the way the Frame will Hold them
     # -------------------------------------------------------------------------------
-    scores_payload = []
+    if stype is datatable.int32:
+        return [v if type(v) is int else _to_integer(v) for v in values]
+    if stype is datatable.float64:
+        return [v if type(v) is float else _to_float(v) for v in values]
+    if stype is datatable.str32:
+        return [v if v is None or type(v) is str else str(v) for v in values]
+    return values
+
+def _to_integer(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def create_scores_payload(measurement, scores, payload, tags=None, schema=None, extra=None, times=None):
+
+    prices = scores['SALE PRICE']
 
     # -------------------------------------------------------------------------------
-    # Enumerate the Sale Prices in List
+    # Format Each Field Column-Wise under its Resolved Name; None marks a value left
+    # out of its line
     # -------------------------------------------------------------------------------
 
-    for count, price in enumerate(scores['SALE PRICE']):
+    columns = []
 
-        # -------------------------------------------------------------------------------
-        # Simplify Payload 
-        # -------------------------------------------------------------------------------
+    for name, stype, values in resolve_columns(payload, schema):
+        if stype is None:
+            continue
+
+        prefix = escape_key(name) + '='
 
-        if(type(payload) == list):
-            data = payload[count]
+        if stype is datatable.int32:
+            columns.append([None if v is None else prefix + str(v) + 'i' for v in validate_integers(values)])
+        elif stype is datatable.float64:
+            columns.append([None if v is None else prefix + repr(float(v)) for v in values])
         else:
-            data = payload
+            columns.append([None if v is None else prefix + escape_string(v) for v in values])
 
-        # -------------------------------------------------------------------------------
-        # Validate Integers from Payload using helper.py function
-        # -------------------------------------------------------------------------------
+    columns.append([None if v is None or v != v else 'SALE\\ PRICE=' + repr(float(v)) for v in prices])
 
-        land_square_feet = validate_integer(data['LAND SQUARE FEET'])
-        gross_square_feet = validate_integer(data['GROSS SQUARE FEET'])
+    # -------------------------------------------------------------------------------
+    # Extra Float Fields, one value per row (e.g. shadow deltas, predict latency)
+    # -------------------------------------------------------------------------------
+    for name, values in sorted((extra or {}).items()):
+        prefix = escape_key(name) + '='
+        columns.append([None if v is None or v != v else prefix + repr(float(v)) for v in values])
 
-        # -------------------------------------------------------------------------------
-        # Build Scores Payload
-        # -------------------------------------------------------------------------------
+    # -------------------------------------------------------------------------------
+    # Unique Nanosecond Timestamps so Rows do not Overwrite Each Other, within a
+    # batch or across concurrent requests, unless the caller supplies the original
+    # times (e.g. backfills)
+    # -------------------------------------------------------------------------------
 
-        scores_payload.append(
-            {
-                "measurement": measurement,
-                "fields": {
-                    "BOROUGH": data['BOROUGH'], 
-                    "NEIGHBORHOOD": data['NEIGHBORHOOD'],
-                    "BUILDING CLASS CATEGORY": data['BUILDING CLASS CATEGORY'],
-                    "COMMERCIAL UNITS": data['COMMERCIAL UNITS'],
-                    "TOTAL UNITS": data['TOTAL UNITS'],
-                    "LAND SQUARE FEET": land_square_feet,
-                    "GROSS SQUARE FEET": gross_square_feet,
-                    "YEAR BUILT": data['YEAR BUILT'],
-                    "BUILDING CLASS AT TIME OF SALE": data['BUILDING CLASS AT TIME OF SALE'],
-                    "SALE PRICE": price
-                }
-            }
-        )
+    series = measurement.replace(',', '\\,').replace(' ', '\\ ')
+    if tags:
+        series += ''.join(',' + escape_key(k) + '=' + escape_key(str(v)) for k, v in sorted(tags.items()))
 
-        # -------------------------------------------------------------------------------
-        # Return Scores Payload
-        # -------------------------------------------------------------------------------
+    if times is None:
+        times = reserve_timestamps(len(prices))
+
+    # -------------------------------------------------------------------------------
+    # Return InfluxDB Line Protocol, One Line per Scored Row; a row with no fields
+    # would be an invalid line, so it is left out
+    # -------------------------------------------------------------------------------
+
+    lines = []
+
+    for timestamp, line in zip(times, zip(*columns)):
+        fields = ','.join(f for f in line if f is not None)
+        if fields:
+            lines.append('{0} {1} {2}'.format(series, fields, timestamp))
+
+    return lines
+
+_last_timestamp = 0
+_timestamp_lock = threading.Lock()
+
+def reserve_timestamps(count):
+
+    # -------------------------------------------------------------------------------
+    # Hand Out Consecutive Ranges from a Per-Process Counter that Never Runs
+    # Behind the Clock, so two requests in the same nanosecond get disjoint ranges
+    # -------------------------------------------------------------------------------
+    global _last_timestamp
+    with _timestamp_lock:
+        start = max(int(time.time() * 1e9), _last_timestamp + 1)
+        _last_timestamp = start + count - 1
+    return range(start, start + count)
+
+def validate_integers(column):
+
+    # -------------------------------------------------------------------------------
+    # Coerce the '-' Sentinel to 0 for a Whole Column in One Pass
+    # -------------------------------------------------------------------------------
+
+    return [v if type(v) is int else (0 if v == '-' else (None if v is None else int(v))) for v in column]
+
+# -------------------------------------------------------------------------------
+# Line Protocol Escaping; a raw newline would end the line, so newlines are
+# written as the two characters \n
+# -------------------------------------------------------------------------------
+def escape_key(key):
+    return escape_newlines(key.replace('\\', '\\\\').replace(',', '\\,').replace('=', '\\=').replace(' ', '\\ '))
+
+def escape_string(value):
+    return '"' + escape_newlines(str(value).replace('\\', '\\\\').replace('"', '\\"')) + '"'
 
-        return scores_payload
+def escape_newlines(value):
+    return value.replace('\r', '\\r').replace('\n', '\\n')
 
 def validate_integer(category):
     if category in ['-']:
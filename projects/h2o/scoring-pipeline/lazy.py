@@ -0,0 +1,34 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+import importlib.util
+import importlib
+import sys
+
+# -------------------------------------------------------------------------------
+# LAZY IMPORTS
+# - lazy_import(name): the module is only executed on first attribute access, so
+#   heavy libraries stay out of start-up for code paths that never use them
+# - preload(*names): execute lazily imported modules now; LazyLoader is not
+#   thread-safe before Python 3.12, so servers call this before starting threads
+# -------------------------------------------------------------------------------
+
+def lazy_import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError("No module named '{0}'".format(name), name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+def preload(*names):
+    for name in names:
+        getattr(importlib.import_module(name), '__name__')
@@ -0,0 +1,172 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+from bisect import bisect_left
+import threading
+import time
+import os
+
+# -------------------------------------------------------------------------------
+# METRICS
+# - SCORING_METRICS=0 turns stage timing off; stage() then returns a shared no-op
+# - stage(name)
+# - observe_rows(name, rows)
+# - observe_model(version, seconds)
+# - observe_dedup(rows, unique)
+# - observe_pooled(name, seconds)
+# - begin_request() / end_request()
+# - server_timing(timings)
+# - register_collector(prefix, collect, counters)   counters are exported with _total
+# - render()
+# -------------------------------------------------------------------------------
+
+ENABLED = os.environ.get('SCORING_METRICS', '1').lower() not in ('0', 'false', 'off')
+
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RATIO_BUCKETS = (0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 1.0)
+ROWS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000, 50000, 100000)
+
+class Histogram:
+    def __init__(self, name, help, buckets, label):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.label = label
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = ['# HELP {0} {1}'.format(self.name, self.help), '# TYPE {0} histogram'.format(self.name)]
+
+        with self._lock:
+            snapshot = [(key, list(series[0]), series[1], series[2]) for key, series in sorted(self.series.items())]
+
+        for key, counts, total, count in snapshot:
+            label = '{0}="{1}"'.format(self.label, key)
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(self.name, label, bound, cumulative))
+            lines.append('{0}_bucket{{{1},le="+Inf"}} {2}'.format(self.name, label, count))
+            lines.append('{0}_sum{{{1}}} {2}'.format(self.name, label, total))
+            lines.append('{0}_count{{{1}}} {2}'.format(self.name, label, count))
+
+        return lines
+
+stage_seconds = Histogram('scoring_stage_seconds', 'Time spent in each /score stage', SECONDS_BUCKETS, 'stage')
+rows = Histogram('scoring_rows', 'Rows per request and per predict call', ROWS_BUCKETS, 'kind')
+model_seconds = Histogram('scoring_model_seconds', 'Scoring latency per model version', SECONDS_BUCKETS, 'version')
+pooled_seconds = Histogram('scoring_pooled_model_seconds', 'Scoring latency per pooled model', SECONDS_BUCKETS, 'model')
+dedup_ratio = Histogram('scoring_dedup_ratio', 'Unique rows over rows per predict batch', RATIO_BUCKETS, 'kind')
+
+_collectors = []
+_local = threading.local()
+
+# -------------------------------------------------------------------------------
+# Stage Timing
+# -------------------------------------------------------------------------------
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stage_seconds.observe(self.name, elapsed)
+        timings = getattr(_local, 'timings', None)
+        if timings is not None:
+            timings.append((self.name, elapsed))
+        return False
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_STAGE = _NoStage()
+
+def stage(name):
+    return _Stage(name) if ENABLED else _NO_STAGE
+
+def observe_rows(name, count):
+    if ENABLED:
+        rows.observe(name, count)
+
+def observe_model(version, seconds):
+    if ENABLED:
+        model_seconds.observe(version, seconds)
+
+def observe_pooled(name, seconds):
+    if ENABLED:
+        pooled_seconds.observe(name, seconds)
+
+def observe_dedup(count, unique):
+    if ENABLED:
+        dedup_ratio.observe('predict', unique / count)
+        if unique < count:
+            rows.observe('duplicate', count - unique)
+
+# -------------------------------------------------------------------------------
+# Per-Request Timings for the Server-Timing Header
+# -------------------------------------------------------------------------------
+def begin_request():
+    _local.timings = []
+
+def end_request():
+    timings = getattr(_local, 'timings', None)
+    _local.timings = None
+    return timings or []
+
+def server_timing(timings):
+    return ', '.join('{0};dur={1:.3f}'.format(name, elapsed * 1000.0) for name, elapsed in timings)
+
+# -------------------------------------------------------------------------------
+# Prometheus Text Format
+# -------------------------------------------------------------------------------
+def register_collector(prefix, collect, counters=()):
+    _collectors.append((prefix, collect, frozenset(counters)))
+
+def render():
+    lines = []
+
+    if ENABLED:
+        lines.extend(stage_seconds.render())
+        lines.extend(rows.render())
+        lines.extend(model_seconds.render())
+        lines.extend(pooled_seconds.render())
+        lines.extend(dedup_ratio.render())
+
+    # -------------------------------------------------------------------------------
+    # Collected Values are Gauges unless the Collector Declares them Monotonic
+    # -------------------------------------------------------------------------------
+    for prefix, collect, counters in _collectors:
+        for key, value in sorted(collect().items()):
+            if key in counters:
+                name = '{0}_{1}_total'.format(prefix, key)
+                lines.append('# TYPE {0} counter'.format(name))
+            else:
+                name = '{0}_{1}'.format(prefix, key)
+                lines.append('# TYPE {0} gauge'.format(name))
+            lines.append('{0} {1}'.format(name, value))
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,149 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+from collections import OrderedDict
+from .registry import ModelRegistry
+from . import helper
+import threading
+import logging
+import re
+import os
+
+# -------------------------------------------------------------------------------
+# MODEL POOL
+# - ModelPool(directory, memory_budget_mb, warmup_requests, interval)
+#   - models live at <directory>/<name>/pipeline.mojo
+#   - get(name) loads and warms a model on first use, then returns its registry
+#   - the least recently used models are evicted once the budget is exceeded
+# -------------------------------------------------------------------------------
+
+MODEL_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.\-]*$')
+
+class _PooledModel:
+    __slots__ = ('registry', 'bytes', 'requests')
+
+    def __init__(self, registry, size):
+        self.registry = registry
+        self.bytes = size
+        self.requests = 0
+
+class ModelPool:
+    COUNTERS = ('pool_loads', 'pool_evictions')
+
+    def __init__(self, directory, memory_budget_mb=0, warmup_requests=3, interval=5.0, logger=None, loader=None):
+        self.directory = directory
+        self.memory_budget = memory_budget_mb << 20
+        self.warmup_requests = warmup_requests
+        self.interval = interval
+        self.logger = logger or logging.getLogger('pool')
+        self.loader = loader
+        self.loads = 0
+        self.evictions = 0
+        self._models = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        if not MODEL_NAME.match(name):
+            raise KeyError(name)
+        path = os.path.join(self.directory, name, 'pipeline.mojo')
+        if not os.path.exists(path):
+            raise KeyError(name)
+        return path
+
+    # -------------------------------------------------------------------------------
+    # Return the Registry for a Model, Loading it on First Use; one thread loads a
+    # given model while other requests for it wait
+    # -------------------------------------------------------------------------------
+    def get(self, name):
+        entry = self._touch(name)
+        if entry is not None:
+            return entry.registry
+
+        with self._lock:
+            loading = self._loading.setdefault(name, threading.Lock())
+
+        with loading:
+            entry = self._touch(name)
+            if entry is not None:
+                return entry.registry
+
+            try:
+                entry = self._load(name)
+            finally:
+                with self._lock:
+                    self._loading.pop(name, None)
+
+        return entry.registry
+
+    def _touch(self, name):
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                self._models.move_to_end(name)
+                entry.requests += 1
+            return entry
+
+    def _load(self, name):
+        path = self.path(name)
+
+        # -------------------------------------------------------------------------------
+        # Size a Model by the Resident Memory its Load and Warm-Up Added, falling back
+        # to its size on disk where /proc is not available
+        # -------------------------------------------------------------------------------
+        before = _rss_bytes()
+        registry = ModelRegistry(path, self.logger, self.interval, self.loader)
+        registry.load()
+        helper.warm_up(self.warmup_requests, self.logger, registry)
+        after = _rss_bytes()
+
+        size = after - before if before is not None and after > before else os.path.getsize(path)
+        registry.watch()
+
+        with self._lock:
+            entry = self._models[name] = _PooledModel(registry, size)
+            entry.requests += 1
+            self.loads += 1
+            self._evict(name)
+
+        self.logger.info("Loaded model {0} ({1:.1f} MB)".format(name, size / 1048576.0))
+        return entry
+
+    # -------------------------------------------------------------------------------
+    # Evict Least Recently Used Models over Budget; requests already holding a
+    # model keep scoring with it
+    # -------------------------------------------------------------------------------
+    def _evict(self, keep):
+        while self.memory_budget and self._used() > self.memory_budget and len(self._models) > 1:
+            name = next(iter(self._models))
+            if name == keep:
+                self._models.move_to_end(name)
+                name = next(iter(self._models))
+            entry = self._models.pop(name)
+            entry.registry.stop()
+            self.evictions += 1
+            self.logger.info("Evicted model {0} after {1} requests".format(name, entry.requests))
+
+    def _used(self):
+        return sum(entry.bytes for entry in self._models.values())
+
+    def names(self):
+        with self._lock:
+            return list(self._models)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'pool_models': len(self._models),
+                'pool_bytes': self._used(),
+                'pool_loads': self.loads,
+                'pool_evictions': self.evictions
+            }
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
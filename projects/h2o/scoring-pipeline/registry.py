@@ -0,0 +1,137 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+import threading
+import logging
+import os
+
+# -------------------------------------------------------------------------------
+# MODEL REGISTRY
+# - load_mojo(path)
+# - ModelRegistry(path, logger)
+# - get_registry(path, logger, interval)
+# -------------------------------------------------------------------------------
+
+MOJO_DIRECTORY = "./lib/pipeline.mojo"
+
+def load_mojo(path):
+
+    # -------------------------------------------------------------------------------
+    # daimojo is only imported by processes that actually load a pipeline
+    # -------------------------------------------------------------------------------
+    import daimojo.model
+    return daimojo.model(path)
+
+class ModelRegistry:
+    def __init__(self, path, logger=None, interval=5.0, loader=None):
+        self.path = path
+        self.logger = logger or logging.getLogger('registry')
+        self.interval = interval
+        self.loader = loader or load_mojo
+        self.model = None
+        self.version = 0
+        self.tag = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._stamp = None
+        self._pending = None
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -------------------------------------------------------------------------------
+    # Load the MOJO and publish it as the current model. Requests already running
+    # keep the reference they took from current(), so nothing in flight is dropped.
+    # -------------------------------------------------------------------------------
+    def load(self):
+        with self._load_lock:
+            return self._load()
+
+    def _load(self):
+        stamp = self._file_stamp()
+        model = self.loader(self.path)
+
+        with self._lock:
+            self.model = model
+            self.version += 1
+            self._stamp = stamp
+            self._pending = None
+            self.tag = '{0}-{1}'.format(*stamp) if stamp else str(self.version)
+            version = self.version
+
+        self.logger.info("Loaded MOJO {0} as version {1}".format(self.path, version))
+
+        for listener in list(self._listeners):
+            listener(model, version)
+
+        return model
+
+    def current(self):
+        if self.model is None:
+            with self._load_lock:
+                if self.model is None:
+                    self._load()
+        with self._lock:
+            return self.model, self.version
+
+    def on_swap(self, listener):
+        self._listeners.append(listener)
+
+    # -------------------------------------------------------------------------------
+    # Watch the MOJO File for Changes
+    # -------------------------------------------------------------------------------
+    def watch(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='mojo-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                self.logger.exception("Failed to reload MOJO {0}".format(self.path))
+
+    def poll(self):
+
+        # -------------------------------------------------------------------------------
+        # Only swap once the file has stopped changing between two polls, so a
+        # pipeline that is still being copied into place is never loaded.
+        # -------------------------------------------------------------------------------
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            self._pending = None
+            return False
+        if stamp != self._pending:
+            self._pending = stamp
+            return False
+
+        self.load()
+        return True
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry(path=MOJO_DIRECTORY, logger=None, interval=5.0):
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry(path, logger, interval)
+    return _registry
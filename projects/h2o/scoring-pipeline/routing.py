@@ -0,0 +1,99 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+from concurrent.futures import ThreadPoolExecutor
+from . import metrics
+import threading
+import logging
+import random
+import time
+
+# -------------------------------------------------------------------------------
+# MODEL ROUTER
+# - ModelRouter(primary, candidate, share, shadows, record)
+#   - primary / candidate / shadows are (name, model_run) pairs
+#   - share of traffic in [0, 1] is answered by the candidate
+#   - shadows score every request on a separate executor after the response
+#   - record(name, role, scores, payload, seconds, deltas) stores the outcome
+# -------------------------------------------------------------------------------
+
+class ModelRouter:
+    COUNTERS = ('shadow_skipped', 'shadow_failed')
+
+    def __init__(self, primary, candidate=None, share=0.0, shadows=None, record=None,
+                 shadow_workers=2, max_pending_shadows=64, logger=None):
+        self.primary = primary
+        self.candidate = candidate
+        self.share = share if candidate is not None else 0.0
+        self.shadows = shadows or []
+        self.record = record
+        self.logger = logger or logging.getLogger('router')
+        self.shadow_skipped = 0
+        self.shadow_failed = 0
+        self._random = random.Random()
+        self._executor = None
+        self._pending = threading.BoundedSemaphore(max_pending_shadows)
+
+        if self.shadows:
+            self._executor = ThreadPoolExecutor(max_workers=shadow_workers, thread_name_prefix='shadow')
+
+    # -------------------------------------------------------------------------------
+    # Answer with the Primary or, for a share of traffic, the Candidate
+    # -------------------------------------------------------------------------------
+    def model_run(self, payload, logger):
+        if self.share and self._random.random() < self.share:
+            (name, run), role = self.candidate, 'candidate'
+        else:
+            (name, run), role = self.primary, 'primary'
+
+        started = time.perf_counter()
+        scores = run(payload, logger)
+        elapsed = time.perf_counter() - started
+        metrics.observe_model(name, elapsed)
+
+        if self.record is not None:
+            self.record(name, role, scores, payload, elapsed, None)
+
+        if self.shadows:
+            self._shadow(payload, scores, logger)
+
+        return scores
+
+    # -------------------------------------------------------------------------------
+    # Shadow Scoring off the Request Path; skipped rather than queued when busy
+    # -------------------------------------------------------------------------------
+    def _shadow(self, payload, answered, logger):
+        for name, run in self.shadows:
+            if not self._pending.acquire(blocking=False):
+                self.shadow_skipped += 1
+                continue
+            future = self._executor.submit(self._score_shadow, name, run, payload, answered, logger)
+            future.add_done_callback(lambda future: self._pending.release())
+
+    def _score_shadow(self, name, run, payload, answered, logger):
+        try:
+            started = time.perf_counter()
+            scores = run(payload, logger)
+            elapsed = time.perf_counter() - started
+            metrics.observe_model(name, elapsed)
+
+            deltas = [
+                None if shadow is None or primary is None else shadow - primary
+                for shadow, primary in zip(scores['SALE PRICE'], answered['SALE PRICE'])
+            ]
+            if self.record is not None:
+                self.record(name, 'shadow', scores, payload, elapsed, deltas)
+        except Exception:
+            self.shadow_failed += 1
+            self.logger.exception("Shadow scoring with {0} failed".format(name))
+
+    def metrics(self):
+        return {
+            'shadow_skipped': self.shadow_skipped,
+            'shadow_failed': self.shadow_failed
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,33 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+from flask_restx import Model, fields
+
+# -------------------------------------------------------------------------------
+# Model Input / Output Definitions
+# - Registered on the Flask Api in __main__.py and shared by the helpers that
+#   need the declared column types
+# -------------------------------------------------------------------------------
+
+model_input = Model(
+    'housing_model_input',
+    {
+        'BOROUGH' : fields.Integer,
+        'NEIGHBORHOOD' : fields.String(),
+        'BUILDING_CLASS_CATEGORY': fields.String(),
+        'COMMERCIAL_UNITS': fields.Integer,
+        'TOTAL_UNITS': fields.Integer,
+        'LAND_SQUARE_FEET': fields.Integer,
+        'GROSS_SQUARE_FEET': fields.Integer,
+        'YEAR_BUILT': fields.Integer,
+        'BUILDING_CLASS_AT_TIME_OF_SALE': fields.String()
+    }
+)
+
+model_output = Model(
+    'housing_model_output',
+    {
+        "SALE PRICE" : fields.List(fields.Float)
+    }
+)
@@ -0,0 +1,195 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+from werkzeug.serving import BaseWSGIServer
+import resource
+import logging
+import signal
+import socket
+import time
+import gc
+import os
+
+# -------------------------------------------------------------------------------
+# PRE-FORK SERVER
+# - PreforkServer(app, host, port, workers, max_requests, max_memory_mb, graceful_timeout)
+#   - post_fork() runs in each worker before it serves, pre_exit() before it exits
+# -------------------------------------------------------------------------------
+
+class PreforkServer:
+    def __init__(self, app, host='0.0.0.0', port=8080, workers=2, max_requests=0,
+                 max_memory_mb=0, graceful_timeout=30.0, logger=None, post_fork=None, pre_exit=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_memory_mb = max_memory_mb
+        self.graceful_timeout = graceful_timeout
+        self.logger = logger or logging.getLogger('server')
+        self.post_fork = post_fork
+        self.pre_exit = pre_exit
+        self._children = {}
+        self._stopping = False
+        self._socket = None
+
+    # -------------------------------------------------------------------------------
+    # Master Process: bind once, fork workers and keep the pool at size
+    # - Everything loaded before run() (the MOJO, datatable, ...) is shared with the
+    #   workers copy-on-write
+    # -------------------------------------------------------------------------------
+    def run(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.listen(128)
+        self._socket.setblocking(False)
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGHUP, self.reload)
+
+        # -------------------------------------------------------------------------------
+        # Keep Long-Lived Objects out of the Collector so it does not Touch their Pages
+        # -------------------------------------------------------------------------------
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+
+        self.logger.info("Listening on {0}:{1} with {2} workers".format(self.host, self.port, self.workers))
+
+        while not self._stopping:
+            while len(self._children) < self.workers and not self._stopping:
+                self._spawn()
+            if not self._reap(block=False):
+                time.sleep(0.2)
+
+        self._shutdown()
+
+    def reload(self, *args):
+
+        # -------------------------------------------------------------------------------
+        # Recycle Workers Gracefully so they Fork from the Master's Current State
+        # -------------------------------------------------------------------------------
+        for pid in list(self._children):
+            self._signal(pid, signal.SIGTERM)
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._work()
+            except Exception:
+                self.logger.exception("Worker failed")
+                code = 1
+            finally:
+
+                # -------------------------------------------------------------------------------
+                # os._exit() skips atexit handlers, so buffered work is flushed here
+                # -------------------------------------------------------------------------------
+                try:
+                    if self.pre_exit is not None:
+                        self.pre_exit()
+                except Exception:
+                    self.logger.exception("Worker exit hook failed")
+                    code = 1
+                os._exit(code)
+
+        self._children[pid] = time.monotonic()
+        self.logger.info("Started worker {0}".format(pid))
+
+    def _reap(self, block):
+        try:
+            pid, status = os.waitpid(-1, 0 if block else os.WNOHANG)
+        except ChildProcessError:
+            return False
+        if pid == 0:
+            return False
+        if self._children.pop(pid, None) is not None:
+            self.logger.info("Worker {0} exited with status {1}".format(pid, status))
+        return True
+
+    def _signal(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            self._children.pop(pid, None)
+
+    def _shutdown(self):
+        self.logger.info("Stopping {0} workers".format(len(self._children)))
+        for pid in list(self._children):
+            self._signal(pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._children and time.monotonic() < deadline:
+            if not self._reap(block=False):
+                time.sleep(0.1)
+
+        for pid in list(self._children):
+            self.logger.warning("Killing worker {0} after graceful timeout".format(pid))
+            self._signal(pid, signal.SIGKILL)
+            self._reap(block=True)
+
+        self._socket.close()
+
+    # -------------------------------------------------------------------------------
+    # Worker Process: serve until stopped, then exit so the master can replace it
+    # -------------------------------------------------------------------------------
+    def _work(self):
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+
+        if self.post_fork is not None:
+            self.post_fork()
+
+        server = _WorkerServer(self.host, self.port, self.app, fd=self._socket.fileno())
+        server.timeout = 1.0
+
+        # -------------------------------------------------------------------------------
+        # Memory is Measured as Growth since Fork; pages still shared with the master
+        # copy-on-write are not the worker's to give back
+        # -------------------------------------------------------------------------------
+        baseline = _memory_mb()
+
+        while not stopping:
+            server.handle_request()
+
+            if self.max_requests and server.handled >= self.max_requests:
+                self.logger.info("Worker {0} recycling after {1} requests".format(os.getpid(), server.handled))
+                break
+            if self.max_memory_mb:
+                grown = _memory_mb() - baseline
+                if grown >= self.max_memory_mb:
+                    self.logger.info("Worker {0} recycling after growing {1:.0f} MB".format(os.getpid(), grown))
+                    break
+
+class _WorkerServer(BaseWSGIServer):
+    handled = 0
+
+    def process_request(self, request, client_address):
+        self.handled += 1
+        BaseWSGIServer.process_request(self, request, client_address)
+
+def _memory_mb():
+
+    # -------------------------------------------------------------------------------
+    # Private Memory where Linux Reports it, then Current RSS; ru_maxrss is the last
+    # resort, since it starts at the master's peak and never drops
+    # -------------------------------------------------------------------------------
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            return sum(int(line.split()[1]) for line in f if line.startswith(('Private_Clean:', 'Private_Dirty:'))) / 1024.0
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1048576.0
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
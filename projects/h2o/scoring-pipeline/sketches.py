@@ -0,0 +1,354 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+from collections import Counter
+from .helper import resolve_columns, escape_key, escape_string
+from .lazy import lazy_import
+import threading
+import logging
+import queue
+import atexit
+import math
+import time
+import zlib
+import os
+
+datatable = lazy_import('datatable')
+
+# -------------------------------------------------------------------------------
+# FEATURE SKETCHES
+# - QuantileSketch(accuracy, max_bins)   DDSketch: relative-error quantiles
+# - CountMinSketch(width, depth, top)    approximate counts and heavy hitters
+# - FeatureSketches(measurement, interval, submit)
+#   - update(version, role, scores, payload) per scored batch; the batch is queued
+#     for the sketch thread (dropped when max_pending batches are waiting), so
+#     requests do not pay for sketching
+#   - flush() writes one summary line per feature and clears the window
+# Every sketch merges with merge(other). Each pre-forked worker flushes its own
+# window, so the min/max/mean/pXX fields are per worker; numeric lines also carry
+# the sketch itself (count, sum, zeros, positive_bins, negative_bins), and
+# QuantileSketch.decode(fields) rebuilds it to merge windows across workers.
+# Heavy-hitter counts add up across workers per value.
+# -------------------------------------------------------------------------------
+
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+class QuantileSketch:
+    def __init__(self, accuracy=0.01, max_bins=2048):
+        self.accuracy = accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._inverse_log_gamma = 1.0 / math.log(self.gamma)
+        self.positive = Counter()
+        self.negative = Counter()
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    # -------------------------------------------------------------------------------
+    # Bin a Whole Column at Once; bin i holds values in (gamma^(i-1), gamma^i]
+    # -------------------------------------------------------------------------------
+    def update(self, values):
+        values = [v for v in values if type(v) in (int, float) and v == v]
+        if not values:
+            return
+
+        log, scale = math.log, self._inverse_log_gamma
+        self.positive.update(math.ceil(log(v) * scale) for v in values if v > 0)
+        self.negative.update(math.ceil(log(-v) * scale) for v in values if v < 0)
+        self.zeros += values.count(0)
+        self.count += len(values)
+        self.total += sum(values)
+        self.minimum = min(self.minimum, min(values))
+        self.maximum = max(self.maximum, max(values))
+        self._collapse()
+
+    def merge(self, other):
+        self.positive.update(other.positive)
+        self.negative.update(other.negative)
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self._collapse()
+
+    def _collapse(self):
+
+        # -------------------------------------------------------------------------------
+        # Constant Memory: fold the bins nearest zero together once over max_bins,
+        # keeping the relative error guarantee for the upper quantiles
+        # -------------------------------------------------------------------------------
+        for store in (self.positive, self.negative):
+            if len(store) <= self.max_bins:
+                continue
+            indexes = sorted(store)
+            excess = len(indexes) - self.max_bins
+            target = indexes[excess]
+            store[target] += sum(store.pop(index) for index in indexes[:excess])
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+
+        # -------------------------------------------------------------------------------
+        # Walk the Bins in Value Order; bin midpoints are clamped to the exact range
+        # -------------------------------------------------------------------------------
+        rank = q * (self.count - 1)
+        seen = 0
+        value = self.maximum
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                value = -self._value(index)
+                break
+        else:
+            seen += self.zeros
+            if seen > rank:
+                value = 0.0
+            else:
+                for index in sorted(self.positive):
+                    seen += self.positive[index]
+                    if seen > rank:
+                        value = self._value(index)
+                        break
+        return min(max(value, self.minimum), self.maximum)
+
+    def _value(self, index):
+        return 2.0 * self.gamma ** index / (self.gamma + 1)
+
+    # -------------------------------------------------------------------------------
+    # Mergeable State as Line-Protocol Field Values; bins are "index:count" pairs
+    # -------------------------------------------------------------------------------
+    def encode(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'zeros': self.zeros,
+            'positive_bins': ','.join('{0}:{1}'.format(*item) for item in sorted(self.positive.items())),
+            'negative_bins': ','.join('{0}:{1}'.format(*item) for item in sorted(self.negative.items()))
+        }
+
+    @classmethod
+    def decode(cls, fields, accuracy=0.01, max_bins=2048):
+        sketch = cls(accuracy, max_bins)
+        for store, name in ((sketch.positive, 'positive_bins'), (sketch.negative, 'negative_bins')):
+            for pair in filter(None, (fields.get(name) or '').split(',')):
+                index, count = pair.split(':')
+                store[int(index)] += int(count)
+        sketch.zeros = int(fields.get('zeros') or 0)
+        sketch.count = int(fields.get('count') or 0)
+        sketch.total = float(fields.get('sum') or 0.0)
+        sketch.minimum = float(fields['min']) if fields.get('min') is not None else math.inf
+        sketch.maximum = float(fields['max']) if fields.get('max') is not None else -math.inf
+        return sketch
+
+class CountMinSketch:
+    def __init__(self, width=2048, depth=4, top=10):
+        self.width = width
+        self.depth = depth
+        self.top = top
+        self.rows = [[0] * width for _ in range(depth)]
+        self.heavy = {}
+        self.count = 0
+
+    # -------------------------------------------------------------------------------
+    # Count Each Distinct Value in the Batch Once; crc32 keeps hashes stable across
+    # processes so sketches from different workers merge
+    # -------------------------------------------------------------------------------
+    def update(self, values):
+        counts = Counter(v if type(v) is str else str(v) for v in values if v is not None)
+        for value, count in counts.items():
+            self._add(value, count)
+        self.count += sum(counts.values())
+
+    def _add(self, value, count):
+        encoded = value.encode('utf-8')
+        estimate = None
+        for seed, row in enumerate(self.rows):
+            column = zlib.crc32(encoded, seed) % self.width
+            row[column] += count
+            estimate = row[column] if estimate is None else min(estimate, row[column])
+        self._track(value, estimate)
+
+    def _track(self, value, estimate):
+        if value in self.heavy or len(self.heavy) < self.top:
+            self.heavy[value] = estimate
+            return
+        smallest = min(self.heavy, key=self.heavy.get)
+        if estimate > self.heavy[smallest]:
+            del self.heavy[smallest]
+            self.heavy[value] = estimate
+
+    def estimate(self, value):
+        encoded = value.encode('utf-8')
+        return min(row[zlib.crc32(encoded, seed) % self.width] for seed, row in enumerate(self.rows))
+
+    def merge(self, other):
+        for row, other_row in zip(self.rows, other.rows):
+            for column, count in enumerate(other_row):
+                row[column] += count
+        self.count += other.count
+        for value in set(self.heavy) | set(other.heavy):
+            self._track(value, self.estimate(value))
+
+    def heavy_hitters(self):
+        return sorted(self.heavy.items(), key=lambda item: (-item[1], item[0]))
+
+class FeatureSketches:
+    COUNTERS = ('sketch_lines_flushed', 'sketch_batches_dropped')
+
+    def __init__(self, measurement='feature_sketches', interval=60.0, submit=None,
+                 accuracy=0.01, top=10, schema=None, logger=None, max_pending=256):
+        self.measurement = measurement
+        self.interval = interval
+        self.submit = submit
+        self.accuracy = accuracy
+        self.top = top
+        self.schema = schema
+        self.logger = logger or logging.getLogger('sketches')
+        self.max_pending = max_pending
+        self.flushed = 0
+        self.dropped = 0
+        self._sketches = {}
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._pid = None
+
+    # -------------------------------------------------------------------------------
+    # Update from One Scored Batch; inputs come from requests the routed models
+    # answered (not shadows or pooled regional models), while SALE PRICE is sketched
+    # per model version
+    # -------------------------------------------------------------------------------
+    def update(self, version, role, scores, payload):
+        self._start()
+
+        if self.interval <= 0:
+            self._apply(version, role, scores, payload)
+            return
+        try:
+            self._pending.put_nowait((version, role, scores, payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def _apply(self, version, role, scores, payload):
+        updates = [(('SALE PRICE', version), 'numeric', scores['SALE PRICE'])]
+        if role not in ('shadow', 'pooled'):
+            for name, kind, values in self._columns(payload):
+                updates.append(((name, ''), kind, values))
+
+        with self._lock:
+            for key, kind, values in updates:
+                sketch = self._sketches.get(key)
+                if sketch is None:
+                    if kind == 'numeric':
+                        sketch = QuantileSketch(self.accuracy)
+                    else:
+                        sketch = CountMinSketch(top=self.top)
+                    self._sketches[key] = sketch
+                sketch.update(values)
+
+    def _columns(self, payload):
+        for name, stype, values in resolve_columns(payload, self.schema):
+            if stype is None:
+                continue
+            kind = 'numeric' if stype in (datatable.int32, datatable.float64) else 'categorical'
+            yield name, kind, values
+
+    # -------------------------------------------------------------------------------
+    # Threads do not survive fork(), so the flush thread starts per process
+    # -------------------------------------------------------------------------------
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._sketches = {}
+                self._pending = queue.Queue(maxsize=self.max_pending)
+                if self.interval > 0:
+                    threading.Thread(target=self._run, name='feature-sketches', daemon=True).start()
+                    atexit.register(self.flush)
+                self._pid = os.getpid()
+
+    def _run(self):
+        deadline = time.monotonic() + self.interval
+        while True:
+            try:
+                self._apply(*self._pending.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                pass
+            except Exception:
+                self.logger.exception("Failed to sketch a scored batch")
+
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.interval
+                try:
+                    self.flush()
+                except Exception:
+                    self.logger.exception("Failed to flush feature sketches")
+
+    def _drain(self):
+        while True:
+            try:
+                batch = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self._apply(*batch)
+            except Exception:
+                self.logger.exception("Failed to sketch a scored batch")
+
+    # -------------------------------------------------------------------------------
+    # One Line-Protocol Summary per Feature per Window, with the state needed to
+    # merge it with other workers' windows
+    # -------------------------------------------------------------------------------
+    def flush(self):
+        self._drain()
+        with self._lock:
+            sketches, self._sketches = self._sketches, {}
+
+        now = int(time.time() * 1e9)
+        series = self.measurement.replace(',', '\\,').replace(' ', '\\ ')
+        lines = []
+
+        for offset, ((name, version), sketch) in enumerate(sorted(sketches.items())):
+            if not sketch.count:
+                continue
+
+            tags = ',feature=' + escape_key(name)
+            if version:
+                tags += ',version=' + escape_key(str(version))
+
+            fields = ['count={0}i'.format(sketch.count)]
+            if isinstance(sketch, QuantileSketch):
+                fields.append('min={0!r}'.format(float(sketch.minimum)))
+                fields.append('max={0!r}'.format(float(sketch.maximum)))
+                fields.append('mean={0!r}'.format(sketch.total / sketch.count))
+                for q in QUANTILES:
+                    fields.append('p{0:02d}={1!r}'.format(int(round(q * 100)), float(sketch.quantile(q))))
+                state = sketch.encode()
+                fields.append('sum={0!r}'.format(float(state['sum'])))
+                fields.append('zeros={0}i'.format(state['zeros']))
+                fields.append('positive_bins={0}'.format(escape_string(state['positive_bins'])))
+                fields.append('negative_bins={0}'.format(escape_string(state['negative_bins'])))
+            else:
+                for rank, (value, count) in enumerate(sketch.heavy_hitters(), 1):
+                    fields.append('top_{0}={1}'.format(rank, escape_string(value)))
+                    fields.append('top_{0}_count={1}i'.format(rank, count))
+
+            lines.append('{0}{1} {2} {3}'.format(series, tags, ','.join(fields), now + offset))
+
+        if lines and self.submit is not None:
+            self.submit(lines)
+            self.flushed += len(lines)
+        return lines
+
+    def metrics(self):
+        return {
+            'sketch_features': len(self._sketches),
+            'sketch_lines_flushed': self.flushed,
+            'sketch_batches_dropped': self.dropped
+        }
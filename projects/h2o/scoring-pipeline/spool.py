@@ -0,0 +1,279 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+import threading
+import logging
+import struct
+import mmap
+import glob
+import time
+import os
+
+# -------------------------------------------------------------------------------
+# WRITE-AHEAD SPOOL
+# - SegmentSpool(directory, segment_bytes, max_segments, retention)
+# - Unavailable: raised by a write when InfluxDB is down rather than refusing the data
+# - Segment files: 16 byte header (magic, line count, committed length) followed by records
+#   of a 4 byte length and newline-joined line protocol
+# - <pid>-<seq>.open   segment being appended to by a live process
+# - <pid>-<seq>.seg    sealed segment waiting to be replayed
+# - <name>.<pid>.claim segment being replayed by a process
+# - <name>.bad         segment that failed to replay for any other reason, kept for inspection
+# -------------------------------------------------------------------------------
+
+_HEADER = struct.Struct('<4sIQ')
+_RECORD = struct.Struct('<I')
+_MAGIC = b'SPL1'
+
+class Unavailable(Exception):
+    pass
+
+class SegmentSpool:
+    COUNTERS = ('spool_spooled', 'spool_replayed', 'spool_expired', 'spool_quarantined')
+
+    def __init__(self, directory, segment_bytes=16 << 20, max_segments=64, retention=86400.0, logger=None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.retention = retention
+        self.logger = logger or logging.getLogger('spool')
+        self.healthy = True
+        self.spooled = 0
+        self.replayed = 0
+        self.expired = 0
+        self.quarantined = 0
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._segment = None
+        self._stop = threading.Event()
+        self._thread = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    # -------------------------------------------------------------------------------
+    # Append Lines to the Open Segment; roll to a new segment when it is full
+    # -------------------------------------------------------------------------------
+    def append(self, lines):
+        data = '\n'.join(lines).encode('utf-8')
+        limit = self.segment_bytes - _HEADER.size - _RECORD.size
+
+        if len(data) > limit:
+            half = len(lines) // 2
+            if half == 0:
+                self.logger.error("Dropping a score record larger than the spool segment size")
+                return
+            self.append(lines[:half])
+            self.append(lines[half:])
+            return
+
+        with self._lock:
+            if self._segment is None or self._segment.free() < _RECORD.size + len(data):
+                self._roll()
+            self._segment.write(data, len(lines))
+            self.spooled += len(lines)
+
+    def pending(self):
+        return len(self._sealed()) + (1 if self._segment is not None and self._segment.lines else 0)
+
+    def metrics(self):
+        return {
+            'spool_segments': self.pending(),
+            'spool_spooled': self.spooled,
+            'spool_replayed': self.replayed,
+            'spool_expired': self.expired,
+            'spool_quarantined': self.quarantined,
+            'spool_healthy': int(self.healthy)
+        }
+
+    def _roll(self):
+        if self._segment is not None:
+            self._segment.seal()
+        self._sequence += 1
+        path = os.path.join(self.directory, '{0}-{1:08d}.open'.format(os.getpid(), self._sequence))
+        self._segment = _Segment.create(path, self.segment_bytes)
+        self._enforce_limits()
+
+    # -------------------------------------------------------------------------------
+    # Retention: bounded segment count and age; the oldest segments go first
+    # -------------------------------------------------------------------------------
+    def _enforce_limits(self):
+        sealed = self._sealed()
+        excess = len(sealed) - self.max_segments
+        now = time.time()
+
+        for index, path in enumerate(sealed):
+            if index >= excess and now - _mtime(path) <= self.retention:
+                continue
+            lines = _Segment.count(path)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self.expired += lines
+            self.logger.warning("Spool segment {0} expired before InfluxDB recovered".format(path))
+
+    def _sealed(self):
+        return sorted(glob.glob(os.path.join(self.directory, '*.seg')), key=_mtime)
+
+    def _recover(self):
+
+        # -------------------------------------------------------------------------------
+        # Seal Segments Left Open or Claimed by Processes that No Longer Exist
+        # -------------------------------------------------------------------------------
+        for path in glob.glob(os.path.join(self.directory, '*.open')) + glob.glob(os.path.join(self.directory, '*.claim')):
+            name = os.path.basename(path)
+            owner = int(name.split('.')[-2] if name.endswith('.claim') else name.split('-')[0])
+            if owner != os.getpid() and _alive(owner):
+                continue
+            sealed = os.path.join(self.directory, name.split('.')[0] + '.seg')
+            try:
+                os.rename(path, sealed)
+            except FileNotFoundError:
+                pass
+
+    # -------------------------------------------------------------------------------
+    # Background Replayer: drain sealed segments in large batches once InfluxDB
+    # accepts writes again
+    # -------------------------------------------------------------------------------
+    def start(self, write, probe, interval=5.0, batch_lines=5000):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._replay, args=(write, probe, interval, batch_lines), name='spool-replayer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            if self._segment is not None:
+                self._segment.seal()
+                self._segment = None
+
+    def _replay(self, write, probe, interval, batch_lines):
+        while not self._stop.wait(interval):
+            try:
+                if not self.healthy:
+                    probe()
+                    self.healthy = True
+
+                with self._lock:
+                    if self._segment is not None and self._segment.lines:
+                        self._segment.seal()
+                        self._segment = None
+                    self._recover()
+
+                for path in self._sealed():
+                    if self._stop.is_set():
+                        break
+                    self._replay_segment(path, write, batch_lines)
+            except Exception:
+                self.healthy = False
+                self.logger.exception("Spool replay paused; InfluxDB is still unavailable")
+
+    def _replay_segment(self, path, write, batch_lines):
+        claimed = '{0}.{1}.claim'.format(path[:-len('.seg')], os.getpid())
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return
+
+        try:
+            batch = []
+            for record in _Segment.read(claimed):
+                batch.extend(record.split('\n'))
+                if len(batch) >= batch_lines:
+                    write(batch)
+                    batch = []
+            if batch:
+                write(batch)
+        except Unavailable:
+            os.rename(claimed, path)
+            raise
+        except Exception:
+
+            # -------------------------------------------------------------------------------
+            # A Segment that Cannot be Replayed must not Hold up the Ones Behind it
+            # -------------------------------------------------------------------------------
+            self.quarantined += _Segment.count(claimed)
+            os.rename(claimed, path[:-len('.seg')] + '.bad')
+            self.logger.exception("Set aside spool segment {0}; it could not be replayed".format(path))
+            return
+
+        self.replayed += _Segment.count(claimed)
+        os.remove(claimed)
+
+class _Segment:
+    def __init__(self, path, handle, buffer, offset, lines):
+        self.path = path
+        self.handle = handle
+        self.buffer = buffer
+        self.offset = offset
+        self.lines = lines
+
+    @classmethod
+    def create(cls, path, size):
+        handle = open(path, 'w+b')
+        handle.truncate(size)
+        buffer = mmap.mmap(handle.fileno(), size)
+        buffer[:_HEADER.size] = _HEADER.pack(_MAGIC, 0, _HEADER.size)
+        return cls(path, handle, buffer, _HEADER.size, 0)
+
+    def free(self):
+        return len(self.buffer) - self.offset
+
+    def write(self, data, lines):
+        end = self.offset + _RECORD.size + len(data)
+        self.buffer[self.offset:self.offset + _RECORD.size] = _RECORD.pack(len(data))
+        self.buffer[self.offset + _RECORD.size:end] = data
+        self.offset = end
+        self.lines += lines
+
+        # -------------------------------------------------------------------------------
+        # Publish the New Length only after the Record Bytes are in Place
+        # -------------------------------------------------------------------------------
+        self.buffer[:_HEADER.size] = _HEADER.pack(_MAGIC, self.lines, self.offset)
+
+    def seal(self):
+        self.buffer.flush()
+        self.buffer.close()
+        self.handle.truncate(self.offset)
+        self.handle.close()
+        os.rename(self.path, self.path[:-len('.open')] + '.seg')
+
+    @staticmethod
+    def read(path):
+        with open(path, 'rb') as handle:
+            magic, lines, length = _HEADER.unpack(handle.read(_HEADER.size))
+            if magic != _MAGIC:
+                return
+            offset = _HEADER.size
+            while offset + _RECORD.size <= length:
+                size, = _RECORD.unpack(handle.read(_RECORD.size))
+                yield handle.read(size).decode('utf-8')
+                offset += _RECORD.size + size
+
+    @staticmethod
+    def count(path):
+        try:
+            with open(path, 'rb') as handle:
+                magic, lines, length = _HEADER.unpack(handle.read(_HEADER.size))
+        except (OSError, struct.error):
+            return 0
+        return lines
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return 0
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
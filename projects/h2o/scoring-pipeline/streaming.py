@@ -0,0 +1,88 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+import json
+
+# -------------------------------------------------------------------------------
+# STREAMING HELPERS
+# - read_ndjson(lines)
+# - score_ndjson(lines, model_run, logger, chunk_size, on_scored, validate)
+# -------------------------------------------------------------------------------
+
+def read_ndjson(lines):
+
+    # -------------------------------------------------------------------------------
+    # Parse One Record per Line; malformed lines are reported in place
+    # -------------------------------------------------------------------------------
+
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line.decode('utf-8') if isinstance(line, bytes) else line)
+        except ValueError as e:
+            yield number, None, str(e)
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Expected a JSON object"
+            continue
+        yield number, record, None
+
+def score_ndjson(lines, model_run, logger, chunk_size=1000, on_scored=None, validate=None):
+
+    # -------------------------------------------------------------------------------
+    # Score Fixed-Size Chunks and Yield NDJSON as Each Chunk Finishes; only one
+    # chunk of records is held in memory at a time, and every input line gets one
+    # output line, in input order
+    # -------------------------------------------------------------------------------
+
+    chunk = []
+
+    for entry in read_ndjson(lines):
+        chunk.append(entry)
+        if len(chunk) >= chunk_size:
+            yield _score_chunk(chunk, model_run, logger, on_scored, validate)
+            chunk = []
+
+    yield _score_chunk(chunk, model_run, logger, on_scored, validate)
+
+def _score_chunk(chunk, model_run, logger, on_scored, validate):
+    if not chunk:
+        return ""
+
+    # -------------------------------------------------------------------------------
+    # Validate the Chunk the Way /score Validates a Payload; invalid records are
+    # reported in place and left out of the prediction
+    # -------------------------------------------------------------------------------
+    errors = dict((index, error) for index, (number, record, error) in enumerate(chunk) if error is not None)
+    if validate is not None:
+        indexes = [index for index in range(len(chunk)) if index not in errors]
+        for problem in validate([chunk[index][1] for index in indexes]):
+            index = indexes[problem['row']]
+            message = problem['message'] if problem['field'] is None else '{0}: {1}'.format(problem['field'], problem['message'])
+            errors[index] = message if index not in errors else errors[index] + '; ' + message
+
+    valid = [record for index, (number, record, error) in enumerate(chunk) if index not in errors]
+
+    # -------------------------------------------------------------------------------
+    # A Failed Prediction Fails its Chunk only; the stream carries on
+    # -------------------------------------------------------------------------------
+    prices = iter(())
+    if valid:
+        try:
+            scores = model_run(valid, logger)
+            if on_scored is not None:
+                on_scored(scores, valid)
+            prices = iter(scores['SALE PRICE'])
+        except Exception as e:
+            logger.exception("Failed to score a chunk of {0} streamed records".format(len(valid)))
+            failure = "Scoring failed: {0}".format(e)
+            errors.update((index, failure) for index in range(len(chunk)) if index not in errors)
+
+    return "".join(
+        json.dumps({"line": number, "error": errors[index]}) + "\n" if index in errors
+        else json.dumps({"SALE PRICE": next(prices)}) + "\n"
+        for index, (number, record, error) in enumerate(chunk)
+    )
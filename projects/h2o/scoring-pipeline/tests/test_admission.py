@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# Name: test_admission.py
+# Purpose: Regression tests for admission control: shedding, expiry, queue order
+#          and slot release
+# Usage: python -m unittest app.tests.test_admission
+# -------------------------------------------------------------------------------
+
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+from app import admission
+from unittest import mock
+import threading
+import unittest
+import time
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for the controller")
+        time.sleep(0.001)
+
+class AdmissionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.controller = admission.AdmissionController(concurrency=1, max_queue=4, interactive_rows=10)
+
+    # -------------------------------------------------------------------------------
+    # Shed: a busy controller turns away what cannot finish in time, or what the
+    # queue has no room for
+    # -------------------------------------------------------------------------------
+    def test_sheds_requests_that_cannot_meet_their_deadline(self):
+        with self.controller.admit(1, 5.0):
+            with self.assertRaises(admission.Rejected) as raised:
+                self.controller.admit(1000, 0.001)
+
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual(self.controller.metrics()['shed'], 1)
+        self.assertEqual(self.controller.metrics()['queue_depth'], 0)
+
+    def test_sheds_when_the_queue_is_full(self):
+        self.controller.max_queue = 1
+
+        def score():
+            with self.controller.admit(1, 10.0):
+                pass
+
+        with self.controller.admit(1, 10.0):
+            queued = threading.Thread(target=score)
+            queued.start()
+            wait_for(lambda: self.controller.metrics()['queue_depth'] == 1)
+            with self.assertRaises(admission.Rejected):
+                self.controller.admit(1, 10.0)
+        queued.join()
+
+        metrics = self.controller.metrics()
+        self.assertEqual(metrics['shed'], 1)
+        self.assertEqual(metrics['admitted'], 2)
+
+    def test_idle_controller_always_admits(self):
+        with self.controller.admit(1000000, 0.001):
+            pass
+
+        self.assertEqual(self.controller.metrics()['admitted'], 1)
+
+    # -------------------------------------------------------------------------------
+    # Expire: a queued request gives up once it can no longer finish in time
+    # -------------------------------------------------------------------------------
+    def test_expires_requests_still_queued_at_their_deadline(self):
+        with self.controller.admit(1, 5.0):
+            with self.assertRaises(admission.Rejected):
+                self.controller.admit(1, 0.05)
+
+        metrics = self.controller.metrics()
+        self.assertEqual(metrics['expired'], 1)
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.assertEqual(metrics['in_flight'], 0)
+
+    # -------------------------------------------------------------------------------
+    # Priority: interactive requests are granted ahead of large batches that
+    # queued before them
+    # -------------------------------------------------------------------------------
+    def test_interactive_requests_jump_ahead_of_large_batches(self):
+        order = []
+
+        def score(name, rows):
+            with self.controller.admit(rows, 10.0):
+                order.append(name)
+
+        held = self.controller.admit(1, 10.0)
+        held.__enter__()
+
+        batch = threading.Thread(target=score, args=('batch', 1000))
+        batch.start()
+        wait_for(lambda: self.controller.metrics()['queue_depth'] == 1)
+        interactive = threading.Thread(target=score, args=('interactive', 1))
+        interactive.start()
+        wait_for(lambda: self.controller.metrics()['queue_depth'] == 2)
+
+        held.__exit__(None, None, None)
+        batch.join()
+        interactive.join()
+
+        self.assertEqual(order, ['interactive', 'batch'])
+
+    # -------------------------------------------------------------------------------
+    # Release: every way out of admit() or the slot hands the slot back
+    # -------------------------------------------------------------------------------
+    def test_releases_the_slot_when_scoring_raises(self):
+        with self.assertRaises(ValueError):
+            with self.controller.admit(1, 5.0):
+                raise ValueError("predict failed")
+
+        self.assertEqual(self.controller.metrics()['in_flight'], 0)
+
+    def test_leaves_the_queue_when_the_wait_is_interrupted(self):
+        with self.controller.admit(1, 5.0):
+            with mock.patch.object(self.controller._condition, 'wait', side_effect=KeyboardInterrupt):
+                with self.assertRaises(KeyboardInterrupt):
+                    self.controller.admit(1, 5.0)
+
+            self.assertEqual(self.controller.metrics()['queue_depth'], 0)
+
+        self.assertEqual(self.controller.metrics()['in_flight'], 0)
+
+    def test_returns_a_slot_granted_as_the_wait_is_interrupted(self):
+        held = self.controller.admit(1, 5.0)
+        held.__enter__()
+
+        def granted_then_interrupted(timeout=None):
+            held.__exit__(None, None, None)
+            raise KeyboardInterrupt
+
+        with mock.patch.object(self.controller._condition, 'wait', side_effect=granted_then_interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                self.controller.admit(1, 5.0)
+
+        metrics = self.controller.metrics()
+        self.assertEqual(metrics['admitted'], 2)
+        self.assertEqual(metrics['in_flight'], 0)
+        self.assertEqual(metrics['queue_depth'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# Name: test_helper.py
+# Purpose: Regression tests for payload column resolution, deduplication and
+#          score timestamps
+# Usage: python -m unittest app.tests.test_helper
+# -------------------------------------------------------------------------------
+
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+from app import helper
+from unittest import mock
+import threading
+import unittest
+
+class DeduplicateTest(unittest.TestCase):
+
+    # -------------------------------------------------------------------------------
+    # Rows Differing only in a Column the First Row Spells Differently
+    # -------------------------------------------------------------------------------
+    def test_keys_on_every_rows_columns(self):
+        payload = [
+            {'BOROUGH': 1, 'LAND SQUARE FEET': 100},
+            {'BOROUGH': 1, 'LAND_SQUARE_FEET': 200},
+            {'BOROUGH': 1, 'LAND_SQUARE_FEET': 300}
+        ]
+        columns, inverse = helper.deduplicate(helper.resolve_columns(payload))
+
+        self.assertEqual(inverse, [0, 1, 2])
+        self.assertEqual(dict((name, values) for name, stype, values in columns)['LAND SQUARE FEET'], [100, 200, 300])
+
+    def test_keys_on_columns_the_first_row_lacks(self):
+        payload = [
+            {'BOROUGH': 1},
+            {'BOROUGH': 1, 'YEAR BUILT': 1990},
+            {'BOROUGH': 1, 'YEAR_BUILT': 2000}
+        ]
+        columns, inverse = helper.deduplicate(helper.resolve_columns(payload))
+
+        self.assertEqual(inverse, [0, 1, 2])
+
+    def test_collapses_rows_under_either_spelling(self):
+        payload = [
+            {'BOROUGH': 1, 'LAND SQUARE FEET': 100},
+            {'BOROUGH': 1, 'LAND_SQUARE_FEET': 100},
+            {'BOROUGH': 2, 'LAND SQUARE FEET': 100}
+        ]
+        columns, inverse = helper.deduplicate(helper.resolve_columns(payload))
+
+        self.assertEqual(inverse, [0, 0, 1])
+        self.assertEqual([values for name, stype, values in columns], [[1, 2], [100, 100]])
+
+class TimestampTest(unittest.TestCase):
+
+    # -------------------------------------------------------------------------------
+    # Requests Written in the Same Nanosecond get Disjoint Ranges
+    # -------------------------------------------------------------------------------
+    def test_ranges_do_not_collide_on_a_stalled_clock(self):
+        with mock.patch.object(helper.time, 'time', return_value=1500000000.0):
+            first = helper.reserve_timestamps(3)
+            second = helper.reserve_timestamps(2)
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(second.start, first.stop)
+
+    def test_ranges_do_not_collide_across_threads(self):
+        reserved = []
+
+        def reserve():
+            for _ in range(200):
+                reserved.extend(helper.reserve_timestamps(5))
+
+        threads = [threading.Thread(target=reserve) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(reserved)), len(reserved))
+
+if __name__ == '__main__':
+    unittest.main()
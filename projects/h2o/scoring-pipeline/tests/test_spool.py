@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# Name: test_spool.py
+# Purpose: Regression tests for the write-ahead spool and the score writer's
+#          handling of records InfluxDB refuses
+# Usage: python -m unittest app.tests.test_spool
+# -------------------------------------------------------------------------------
+
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+from influxdb.exceptions import InfluxDBClientError, InfluxDBServerError
+from app.spool import SegmentSpool, Unavailable
+from app.writer import ScoreWriter
+import tempfile
+import unittest
+import logging
+import glob
+import os
+
+class SpoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.spool = SegmentSpool(self.directory.name, segment_bytes=4096, logger=logging.getLogger('test'))
+
+    def files(self, suffix):
+        return glob.glob(os.path.join(self.directory.name, '*' + suffix))
+
+    def replay(self, write):
+        for path in self.spool._sealed():
+            self.spool._replay_segment(path, write, batch_lines=5000)
+
+    # -------------------------------------------------------------------------------
+    # Append, Seal and Replay: every line comes back once, in order
+    # -------------------------------------------------------------------------------
+    def test_replays_sealed_segments_in_order(self):
+        self.spool.append(['a 1', 'b 2'])
+        self.spool.append(['c 3'])
+        self.spool.stop()
+
+        self.assertEqual(len(self.files('.seg')), 1)
+
+        written = []
+        self.replay(written.extend)
+
+        self.assertEqual(written, ['a 1', 'b 2', 'c 3'])
+        self.assertEqual(self.spool.replayed, 3)
+        self.assertEqual(self.spool.pending(), 0)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_rolls_to_a_new_segment_when_full(self):
+        lines = ['line {0} {1}'.format(index, 'x' * 200) for index in range(50)]
+        for line in lines:
+            self.spool.append([line])
+        self.spool.stop()
+
+        self.assertGreater(len(self.files('.seg')), 1)
+
+        written = []
+        self.replay(written.extend)
+
+        self.assertEqual(written, lines)
+
+    def test_recovers_segments_left_open(self):
+        self.spool.append(['a 1'])
+        segment = self.spool._segment
+        segment.buffer.flush()
+        self.addCleanup(segment.handle.close)
+        self.addCleanup(segment.buffer.close)
+
+        recovered = SegmentSpool(self.directory.name, segment_bytes=4096)
+
+        self.assertEqual(len(self.files('.open')), 0)
+        written = []
+        for path in recovered._sealed():
+            recovered._replay_segment(path, written.extend, batch_lines=5000)
+        self.assertEqual(written, ['a 1'])
+
+    # -------------------------------------------------------------------------------
+    # Replay Failures: an outage leaves the segment for the next attempt; anything
+    # else sets it aside so the segments behind it still replay
+    # -------------------------------------------------------------------------------
+    def test_keeps_the_segment_while_influxdb_is_unavailable(self):
+        self.spool.append(['a 1'])
+        self.spool.stop()
+
+        def unavailable(batch):
+            raise Unavailable("connection refused")
+
+        with self.assertRaises(Unavailable):
+            self.replay(unavailable)
+
+        self.assertEqual(len(self.files('.seg')), 1)
+        self.assertEqual(self.spool.replayed, 0)
+        self.assertEqual(self.spool.quarantined, 0)
+
+    def test_quarantines_a_segment_that_cannot_be_replayed(self):
+        self.spool.append(['a 1', 'b 2'])
+        self.spool._roll()
+        self.spool.append(['c 3'])
+        self.spool.stop()
+
+        written = []
+
+        def write(batch):
+            if 'a 1' in batch:
+                raise ValueError("unreadable")
+            written.extend(batch)
+
+        with self.assertLogs('test', 'ERROR'):
+            self.replay(write)
+
+        self.assertEqual(written, ['c 3'])
+        self.assertEqual(len(self.files('.bad')), 1)
+        self.assertEqual(self.spool.quarantined, 2)
+        self.assertEqual(self.spool.replayed, 1)
+
+class WriterDeliverTest(unittest.TestCase):
+
+    # -------------------------------------------------------------------------------
+    # A Writer without its Client or Thread; _write fails the way InfluxDB does
+    # -------------------------------------------------------------------------------
+    def setUp(self):
+        self.writer = ScoreWriter.__new__(ScoreWriter)
+        self.writer.logger = logging.getLogger('test')
+        self.writer.rejected = 0
+        self.written = []
+        self.writer._write = self.write
+
+    def write(self, batch):
+        if any('down' in line for line in batch):
+            raise InfluxDBServerError("service unavailable")
+        if any('bad' in line for line in batch):
+            raise InfluxDBClientError("unable to parse", 400)
+        self.written.extend(batch)
+
+    def test_bisects_around_refused_records(self):
+        with self.assertLogs('test', 'ERROR'):
+            count = self.writer._deliver(['a 1', 'bad', 'c 3', 'd 4', 'e 5'])
+
+        self.assertEqual(count, 4)
+        self.assertEqual(self.writer.rejected, 1)
+        self.assertEqual(self.written, ['a 1', 'c 3', 'd 4', 'e 5'])
+
+    def test_outages_are_not_bisected(self):
+        with self.assertRaises(Unavailable):
+            self.writer._deliver(['a 1', 'down', 'c 3'])
+
+        self.assertEqual(self.writer.rejected, 0)
+        self.assertEqual(self.written, [])
+
+    def test_throttling_counts_as_an_outage(self):
+        def throttled(batch):
+            raise InfluxDBClientError("too many requests", 429)
+        self.writer._write = throttled
+
+        with self.assertRaises(Unavailable):
+            self.writer._deliver(['a 1', 'b 2'])
+
+        self.assertEqual(self.writer.rejected, 0)
+
+if __name__ == '__main__':
+    unittest.main()
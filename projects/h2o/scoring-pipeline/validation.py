@@ -0,0 +1,120 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+from flask_restx import fields
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# -------------------------------------------------------------------------------
+# COMPILED VALIDATION AND SERIALIZATION
+# - compile_validator(model)
+# - compile_serializer(model)
+# - loads(data) / dumps(obj)   orjson when installed, otherwise the json module
+# -------------------------------------------------------------------------------
+
+_MISSING = object()
+
+def _field_kind(field):
+    kind = field if isinstance(field, type) else type(field)
+    if issubclass(kind, fields.Integer):
+        return 'integer'
+    if issubclass(kind, (fields.Float, fields.Arbitrary)):
+        return 'number'
+    if issubclass(kind, fields.Boolean):
+        return 'boolean'
+    if issubclass(kind, fields.List):
+        return 'list'
+    return 'string'
+
+def _is_integer(value):
+    if value == '-':
+        return True
+    try:
+        int(value)
+    except (TypeError, ValueError):
+        return False
+    return not isinstance(value, (bool, float))
+
+# -------------------------------------------------------------------------------
+# Checks per Declared Field Type; each is a Python expression over `value`
+# -------------------------------------------------------------------------------
+_CHECKS = {
+    'integer': ('(type(value) is int or _is_integer(value))', 'an integer'),
+    'number': ('(type(value) in (int, float))', 'a number'),
+    'boolean': ('(type(value) is bool)', 'a boolean'),
+    'string': ('(type(value) is str)', 'a string'),
+    'list': ('(type(value) is list)', 'a list')
+}
+
+def compile_validator(model):
+
+    # -------------------------------------------------------------------------------
+    # Generate One Function that Checks Every Row in a Single Pass; rows may use
+    # the declared field name or its spaced form
+    # -------------------------------------------------------------------------------
+    lines = [
+        'def validate(payload):',
+        '    rows = payload if type(payload) is list else [payload]',
+        '    errors = []',
+        '    for index, row in enumerate(rows):',
+        '        if type(row) is not dict:',
+        '            errors.append({"row": index, "field": None, "message": "Expected a JSON object"})',
+        '            continue'
+    ]
+
+    for name, field in model.items():
+        check, expected = _CHECKS[_field_kind(field)]
+        spaced = name.replace('_', ' ')
+        lines.append('        value = row.get({0!r}, _MISSING)'.format(name))
+        if spaced != name:
+            lines.append('        if value is _MISSING:')
+            lines.append('            value = row.get({0!r}, _MISSING)'.format(spaced))
+        lines.append('        if value is not _MISSING and value is not None and not {0}:'.format(check))
+        lines.append('            errors.append({{"row": index, "field": {0!r}, "message": "Expected {1}, got " + repr(value)}})'.format(name, expected))
+
+    lines.append('    return errors')
+
+    namespace = {'_MISSING': _MISSING, '_is_integer': _is_integer}
+    exec(compile('\n'.join(lines), '<validator {0}>'.format(model.name), 'exec'), namespace)
+    return namespace['validate']
+
+def compile_serializer(model):
+
+    # -------------------------------------------------------------------------------
+    # Generate One Function that Shapes Output like marshal_with(model)
+    # -------------------------------------------------------------------------------
+    entries = []
+
+    for name, field in model.items():
+        kind = _field_kind(field)
+        value = 'data.get({0!r})'.format(name)
+        if kind == 'list':
+            item = _field_kind(field.container)
+            if item in ('number', 'integer'):
+                cast = 'float' if item == 'number' else 'int'
+                value = '_list({0}, {1})'.format(value, cast)
+        entries.append('{0!r}: {1}'.format(name, value))
+
+    source = 'def serialize(data):\n    return {' + ', '.join(entries) + '}'
+
+    namespace = {'_list': lambda values, cast: None if values is None else [None if v is None else cast(v) for v in values]}
+    exec(compile(source, '<serializer {0}>'.format(model.name), 'exec'), namespace)
+    return namespace['serialize']
+
+# -------------------------------------------------------------------------------
+# JSON Backend
+# -------------------------------------------------------------------------------
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode('utf-8') if isinstance(data, bytes) else data)
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
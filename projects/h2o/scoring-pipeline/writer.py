@@ -0,0 +1,223 @@
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+
+from .spool import SegmentSpool, Unavailable
+import threading
+import logging
+import atexit
+import queue
+import time
+import os
+
+# -------------------------------------------------------------------------------
+# SCORE WRITER
+# - ScoreWriter(host, port, username, password, database)
+# - get_writer()
+# Connection errors, timeouts and 5xx responses mean InfluxDB is down, so records
+# are spooled; any other 4xx means InfluxDB refused the data, so the batch is
+# bisected and the records it refuses are logged and dropped
+# -------------------------------------------------------------------------------
+
+_UNAVAILABLE_CODES = (401, 403, 404, 408, 429)
+
+class ScoreWriter:
+    COUNTERS = ('dropped', 'written', 'failed', 'rejected') + SegmentSpool.COUNTERS
+
+    def __init__(self, host, port, username, password, database, logger=None,
+                 max_queue=10000, batch_size=500, flush_interval=1.0,
+                 time_precision='n', protocol='line', timeout=2.0, spool=None):
+        self.database = database
+        self.logger = logger or logging.getLogger('writer')
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.time_precision = time_precision
+        self.protocol = protocol
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+        self.spool = spool
+
+        # -------------------------------------------------------------------------------
+        # One Client per Process; the underlying requests.Session keeps connections alive
+        # and the timeout is the deadline after which records go to the spool
+        # -------------------------------------------------------------------------------
+        from influxdb import InfluxDBClient
+        self.client = InfluxDBClient(host=host, port=port, username=username, password=password, timeout=timeout)
+        try:
+            self.client.create_database(database)
+        except Exception:
+            self.logger.exception("Failed to create InfluxDB database {0}".format(database))
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='influx-writer', daemon=True)
+        self._thread.start()
+
+        if self.spool is not None:
+            self.spool.start(self._deliver, self.client.ping)
+
+    # -------------------------------------------------------------------------------
+    # Enqueue Score Records without Blocking the Request
+    # -------------------------------------------------------------------------------
+    def submit(self, points):
+        for point in points:
+            try:
+                self._queue.put_nowait(point)
+            except queue.Full:
+                if self.spool is None:
+                    self.dropped += 1
+                else:
+                    self.spool.append([point])
+
+    def metrics(self):
+        metrics = {
+            'queue_depth': self._queue.qsize(),
+            'dropped': self.dropped,
+            'written': self.written,
+            'failed': self.failed,
+            'rejected': self.rejected
+        }
+        if self.spool is not None:
+            metrics.update(self.spool.metrics())
+        return metrics
+
+    # -------------------------------------------------------------------------------
+    # Background Flush by Batch Size or Age
+    # -------------------------------------------------------------------------------
+    def _run(self):
+        batch = []
+        deadline = None
+
+        while not (self._stop.is_set() and self._queue.empty()):
+            timeout = self.flush_interval if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                deadline = None
+
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+
+        # -------------------------------------------------------------------------------
+        # While InfluxDB is Down, Spool Straight to Disk; the replayer probes for recovery
+        # -------------------------------------------------------------------------------
+        if self.spool is not None and not self.spool.healthy:
+            self.spool.append(batch)
+            return
+
+        try:
+            self.written += self._deliver(batch)
+        except Unavailable:
+            if self.spool is None:
+                self.failed += len(batch)
+                self.logger.exception("Failed to write {0} score records to InfluxDB".format(len(batch)))
+            else:
+                self.spool.healthy = False
+                self.spool.append(batch)
+                self.logger.exception("Spooled {0} score records to disk; InfluxDB write failed".format(len(batch)))
+        except Exception:
+            self.failed += len(batch)
+            self.logger.exception("Failed to write {0} score records to InfluxDB".format(len(batch)))
+
+    # -------------------------------------------------------------------------------
+    # Write a Batch, Bisecting around Records InfluxDB Refuses; returns the number
+    # of records written
+    # -------------------------------------------------------------------------------
+    def _deliver(self, batch):
+        try:
+            self._write(batch)
+        except Exception as e:
+            if _unavailable(e):
+                raise Unavailable(str(e)) from e
+            if not _refused(e):
+                raise
+            if len(batch) == 1:
+                self.rejected += 1
+                self.logger.error("InfluxDB refused a score record ({0}): {1}".format(e, batch[0]))
+                return 0
+            half = len(batch) // 2
+            return self._deliver(batch[:half]) + self._deliver(batch[half:])
+        return len(batch)
+
+    def _write(self, batch):
+        self.client.write_points(
+            batch,
+            database=self.database,
+            time_precision=self.time_precision,
+            protocol=self.protocol
+        )
+
+    # -------------------------------------------------------------------------------
+    # Drain the Queue on Shutdown
+    # -------------------------------------------------------------------------------
+    def close(self, timeout=None):
+        self._stop.set()
+        self._thread.join(timeout)
+        if self.spool is not None:
+            self.spool.stop()
+        self.client.close()
+
+def _unavailable(error):
+    from influxdb.exceptions import InfluxDBClientError, InfluxDBServerError
+    from requests.exceptions import ConnectionError, Timeout
+    if isinstance(error, (InfluxDBServerError, ConnectionError, Timeout)):
+        return True
+    return isinstance(error, InfluxDBClientError) and error.code in _UNAVAILABLE_CODES
+
+def _refused(error):
+    from influxdb.exceptions import InfluxDBClientError
+    return isinstance(error, InfluxDBClientError) and error.code is not None and 400 <= error.code < 500
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+
+    # -------------------------------------------------------------------------------
+    # Threads do not survive fork(), so each process builds its own writer
+    # -------------------------------------------------------------------------------
+    global _writer, _writer_pid
+    if _writer is None or _writer_pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer_pid != os.getpid():
+
+                # -------------------------------------------------------------------------------
+                # Disk Spool for Records InfluxDB does not Accept in Time (INFLUX_SPOOL_DIR='' disables)
+                # -------------------------------------------------------------------------------
+                spool_directory = os.environ.get('INFLUX_SPOOL_DIR', './spool')
+                spool = None
+                if spool_directory:
+                    spool = SegmentSpool(
+                        spool_directory,
+                        segment_bytes=int(os.environ.get('INFLUX_SPOOL_SEGMENT_MB', 16)) << 20,
+                        max_segments=int(os.environ.get('INFLUX_SPOOL_MAX_SEGMENTS', 64)),
+                        retention=float(os.environ.get('INFLUX_SPOOL_RETENTION_HOURS', 24)) * 3600
+                    )
+
+                _writer = ScoreWriter(
+                    host=os.environ.get('INFLUXDB_HOST', 'localhost'),
+                    port=int(os.environ.get('INFLUXDB_PORT', 8086)),
+                    username=os.environ.get('INFLUXDB_USERNAME', 'root'),
+                    password=os.environ.get('INFLUXDB_PASSWORD', 'root'),
+                    database=os.environ.get('INFLUXDB_DATABASE', 'housing'),
+                    max_queue=int(os.environ.get('INFLUX_QUEUE_SIZE', 10000)),
+                    batch_size=int(os.environ.get('INFLUX_BATCH_SIZE', 500)),
+                    flush_interval=float(os.environ.get('INFLUX_FLUSH_INTERVAL', 1.0)),
+                    timeout=float(os.environ.get('INFLUX_WRITE_TIMEOUT', 2.0)),
+                    spool=spool
+                )
+                _writer_pid = os.getpid()
+                atexit.register(_writer.close)
+    return _writer
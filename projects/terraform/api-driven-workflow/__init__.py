@@ -1 +1 @@
-from .helper import Workspace
\ No newline at end of file
+from .helper import Workspace, AsyncWorkspace
\ No newline at end of file
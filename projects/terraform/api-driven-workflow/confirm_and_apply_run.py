@@ -170,6 +170,9 @@ if __name__ == '__main__':
                     # END WHILE LOOP
                     done = True
 
+        # CLOSE POOLED CONNECTIONS
+        ws.close()
+
     except SystemExit as err:
         logger.exception('main failed with exception')
         logger.error(str(err))
\ No newline at end of file
@@ -1,4 +1,6 @@
-import requests, logging, tarfile, json, os
+import aiohttp, asyncio, email.utils, threading, datetime, logging, tarfile, random, time, json, os
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
 
 class _ExcludeErrorsFilter(logging.Filter):
     def filter(self, record):
@@ -24,8 +26,191 @@ class _RedactingFilter(logging.Filter):
                msg = msg.replace(pattern, "***")
         return msg
 
-class Workspace:
-    def __init__(self, org, name, version, token, logger):
+# -------------------------------------------------------------------------------
+# Client-Side Rate Limiting
+# Terraform Cloud allows about 30 requests per second per token, so every
+# Workspace using the same token (in any thread) draws from one bucket
+# -------------------------------------------------------------------------------
+class TokenBucket:
+    def __init__(self, rate=30.0, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.throttled = 0
+        self.retries = 0
+        self.waited = 0.0
+        self._updated = time.monotonic()
+        self._resume = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            # RESERVE A TOKEN; CALLERS SLEEP OUTSIDE THE LOCK UNTIL IT IS THEIRS
+            self.tokens -= 1
+            wait = max(-self.tokens / self.rate, self._resume - now, 0.0)
+            self.waited += wait
+
+        return wait
+
+    def defer(self, seconds):
+        # HOLD EVERY CALLER SHARING THIS TOKEN UNTIL THE SERVER'S RETRY-AFTER HAS PASSED
+        with self._lock:
+            self._resume = max(self._resume, time.monotonic() + seconds)
+
+    def record_retry(self, status_code, delay):
+        with self._lock:
+            self.retries += 1
+            self.waited += delay
+            if status_code == 429:
+                self.throttled += 1
+
+    def metrics(self):
+        return {
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "wait_seconds": round(self.waited, 3)
+        }
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_bucket(token, rate=30.0):
+    with _buckets_lock:
+        if token not in _buckets:
+            _buckets[token] = TokenBucket(rate)
+        return _buckets[token]
+
+def _retry_after(headers):
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        moment = email.utils.parsedate_to_datetime(value)
+        return max((moment - datetime.datetime.now(moment.tzinfo)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+# -------------------------------------------------------------------------------
+# Async Terraform Cloud Client
+# Many AsyncWorkspace instances can share one session (and its connection pool
+# and concurrency limit) by passing client=other_workspace.client
+# -------------------------------------------------------------------------------
+class AsyncClient:
+    def __init__(self, token, logger, concurrency=10, pool_size=10, timeout=(5, 30),
+                 rate_limit=30.0, max_retries=5, backoff=0.5, max_backoff=30.0):
+        self.token = token
+        self.logger = logger
+        self.concurrency = concurrency
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.bucket = get_bucket(token, rate_limit)
+        self.header = {
+            "content-type": "application/vnd.api+json",
+            "Authorization": "Bearer {0}".format(token)
+        }
+        self.stats = {"requests": 0, "connections": 0, "reused": 0}
+        self.session = None
+        self._limit = None
+
+    # -------------------------------------------------------------------------------
+    # One Keep-Alive Session, created inside the running event loop; aiohttp asks
+    # for gzip and decompresses responses transparently
+    # -------------------------------------------------------------------------------
+    def _open(self):
+        if self.session is not None:
+            return
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(self._count("requests"))
+        trace.on_connection_create_end.append(self._count("connections"))
+        trace.on_connection_reuseconn.append(self._count("reused"))
+
+        connect, read = self.timeout
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read),
+            trace_configs=[trace]
+        )
+        self._limit = asyncio.Semaphore(self.concurrency)
+
+    def _count(self, key):
+        async def count(session, context, params):
+            self.stats[key] += 1
+        return count
+
+    async def close(self):
+        self.logger.debug("Connections: {0} requests over {1} connections ({2} reused)".format(
+            self.stats["requests"], self.stats["connections"], self.stats["reused"]))
+        self.logger.debug("Rate limiting: {0} throttled, {1} retries, {2}s waiting".format(
+            self.bucket.throttled, self.bucket.retries, self.bucket.metrics()["wait_seconds"]))
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    # -------------------------------------------------------------------------------
+    # Send a Request through the Concurrency Limit and the Shared Rate Limiter
+    # - 429 is retried for every method; the server did not process the request
+    # - 5xx and connection errors are only retried for idempotent methods
+    # - waits honor Retry-After, otherwise jittered exponential backoff
+    # - statuses in `missing` return None; any other error raises Exception
+    # -------------------------------------------------------------------------------
+    async def send(self, method, url, data=None, header=None, missing=(), raw=False, check=True):
+        self._open()
+        idempotent = method in IDEMPOTENT_METHODS
+        header = self.header if header is None else header
+
+        async with self._limit:
+            for attempt in range(self.max_retries + 1):
+                await asyncio.sleep(self.bucket.reserve())
+
+                status, headers, content, error = None, {}, b"", None
+                try:
+                    async with self.session.request(method, url, data=data, headers=header) as response:
+                        status, reason, headers = response.status, response.reason, response.headers
+                        content = await response.read()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                    if not idempotent or attempt == self.max_retries:
+                        raise Exception("{0}".format(err) or "Timed out: {0}".format(url))
+                    error = err
+
+                if error is None and ((status != 429 and (status < 500 or not idempotent)) or attempt == self.max_retries):
+                    break
+
+                delay = _retry_after(headers)
+                if delay is None:
+                    delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                elif status == 429:
+                    self.bucket.defer(delay)
+
+                self.bucket.record_retry(status, delay)
+                self.logger.debug("{0} {1} returned {2}; retry {3}/{4} in {5:.2f}s".format(
+                    method, url, status or "a connection error", attempt + 1, self.max_retries, delay))
+                await asyncio.sleep(delay)
+
+        if status in missing:
+            return None
+        if check and status >= 400:
+            kind = "Client" if status < 500 else "Server"
+            raise Exception("{0} {1} Error: {2} for url: {3}".format(status, kind, reason, url))
+
+        return content if raw else json.loads(content.decode("utf-8"))
+
+    def metrics(self):
+        return self.bucket.metrics()
+
+class AsyncWorkspace:
+    def __init__(self, org, name, version, token, logger, client=None, **options):
         self.org = org
         self.name = name
         self.version = version
@@ -34,161 +219,106 @@ class Workspace:
         self.id = ""
         self.config_version_id = ""
         self.upload_url = ""
+        self.client = client or AsyncClient(token, logger, **options)
+
+    async def close(self):
+        await self.client.close()
+
+    def metrics(self):
+        return self.client.metrics()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+        return False
 
     # -------------------------------------------------------------------------------
     # API Reference Doc - Workspaces
     # https://www.terraform.io/docs/cloud/api/workspaces.html
     # -------------------------------------------------------------------------------
-    def create_workspace(self, payload: list):
+    async def create_workspace(self, payload: list):
 
         url = "https://app.terraform.io/api/v2/organizations/{0}/workspaces".format(self.org)
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
         payload = json.dumps(payload)
 
-        try:
-            response = requests.post(url,data=payload,headers=header)
-            response.raise_for_status()
-            self.id = response.json()["data"]["id"]
-        except requests.exceptions.HTTPError as errh:
-            if errh.response.status_code == 422:
-                return False
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+        response = await self.client.send("POST", url, data=payload, missing=(422,))
+        if response is None:
+            return False
+        self.id = response["data"]["id"]
 
-        return response.json()
+        return response
 
-    def update_workspace(self, payload: list):
+    async def update_workspace(self, payload: list):
 
         url = "https://app.terraform.io/api/v2/organizations/{0}/workspaces/{1}".format(self.org,self.name)
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
         payload = json.dumps(payload)
 
-        try:
-            response = requests.patch(url,data=payload,headers=header)
-            response.raise_for_status()
-            self.id = response.json()["data"]["id"]
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+        response = await self.client.send("PATCH", url, data=payload)
+        self.id = response["data"]["id"]
 
-        return response.json() 
+        return response
 
-    def show_workspace(self):                 
+    async def show_workspace(self):
 
         url = "https://app.terraform.io/api/v2/organizations/{0}/workspaces/{1}".format(self.org,self.name)
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
 
-        try: 
-            response = requests.get(url,headers=header)
-            response.raise_for_status()
-            self.id = response.json()["data"]["id"]
-        except requests.exceptions.HTTPError as errh:
-            if errh.response.status_code == 404:
-                return False
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+        response = await self.client.send("GET", url, missing=(404,))
+        if response is None:
+            return False
+        self.id = response["data"]["id"]
 
-        return response.json()
+        return response
 
-    def list_workspaces(self):                 
+    async def list_workspaces(self):
 
         url = "https://app.terraform.io/api/v2/organizations/{0}/workspaces".format(self.org)
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
 
-        try: 
-            response = requests.get(url,headers=header)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as errh:
-            if errh.response.status_code == 404:
-                return False
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+        response = await self.client.send("GET", url, missing=(404,))
+        if response is None:
+            return False
 
-        return response.json()
+        return response
 
     # -------------------------------------------------------------------------------
     # API Reference Doc - Configuration Versions
     # https://www.terraform.io/docs/cloud/api/configuration-versions.html
     # -------------------------------------------------------------------------------
-    def list_config_version(self, query=""):
-        
+    async def list_config_version(self, query=""):
+
         url = "https://app.terraform.io/api/v2/workspaces/{0}/configuration-versions{1}".format(self.id,query)
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
 
-        try:
-            response = requests.get(url,headers=header)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+        return await self.client.send("GET", url)
 
-        return response.json()
+    async def show_config_version(self):
 
-    def show_config_version(self):
-        
         url = "https://app.terraform.io/api/v2/configuration-versions/{0}".format(self.config_version_id)
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
-
-        try:
-            response = requests.get(url,headers=header)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
 
-        return response.json()
+        return await self.client.send("GET", url)
 
-    def create_config_version(self, payload: list):
+    async def create_config_version(self, payload: list):
 
         url = "https://app.terraform.io/api/v2/workspaces/{0}/configuration-versions".format(self.id)
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
         payload = json.dumps(payload)
 
-        try:
-            response = requests.post(url,data=payload,headers=header)
-            response.raise_for_status()
-            self.config_version_id = response.json()["data"]["id"]
-            self.upload_url = response.json()["data"]["attributes"]["upload-url"]
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+        response = await self.client.send("POST", url, data=payload)
+        self.config_version_id = response["data"]["id"]
+        self.upload_url = response["data"]["attributes"]["upload-url"]
 
-        return response.json()
+        return response
 
-    def upload_config_files(self, payload):
-        
-        success = False
+    async def upload_config_files(self, payload):
 
+        # PRE-SIGNED URL; THE API TOKEN IS NOT SENT
         url = self.upload_url
         header = {
-            "content-type": "application/octet-stream", 
+            "content-type": "application/octet-stream",
         }
 
-        try:
-            response = requests.put(url,data=payload,headers=header)
-            response.raise_for_status()
-            success = True
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+        await self.client.send("PUT", url, data=payload, header=header, raw=True)
 
-        return success
+        return True
 
     def create_tarball(self, tarball, source_directory):
 
@@ -200,155 +330,153 @@ class Workspace:
             return payload
 
     # -------------------------------------------------------------------------------
-    # API Reference Doc - Workspace Variables 
+    # API Reference Doc - Workspace Variables
     # https://www.terraform.io/docs/cloud/api/workspace-variables.html
     # -------------------------------------------------------------------------------
-    def create_variable(self, payload: list):
+    async def create_variable(self, payload: list):
 
         url = "https://app.terraform.io/api/v2/workspaces/{0}/vars".format(self.id)
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
         payload = json.dumps(payload)
 
-        try:
-            response = requests.post(url,data=payload,headers=header)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+        response = await self.client.send("POST", url, data=payload)
 
-        return response.json()["data"]["id"] 
+        return response["data"]["id"]
 
-    def list_variables(self):
-        
-        url = "https://app.terraform.io/api/v2/workspaces/{0}/vars".format(self.id)
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
+    async def list_variables(self):
 
-        try:
-            response = requests.get(url,headers=header)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+        url = "https://app.terraform.io/api/v2/workspaces/{0}/vars".format(self.id)
 
-        return response.json()
+        return await self.client.send("GET", url)
 
-    def update_variable(self, variable_id, payload: list):
-        success = False
+    async def update_variable(self, variable_id, payload: list):
 
         url = "https://app.terraform.io/api/v2/workspaces/{0}/vars/{1}".format(self.id, variable_id)
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
         payload = json.dumps(payload)
 
-        try:
-            response = requests.patch(url,data=payload,headers=header)
-            response.raise_for_status()
-            success = True
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+        await self.client.send("PATCH", url, data=payload, raw=True)
 
-        return success
+        return True
 
-    def delete_variable(self, variable_id):
-        success = False
+    async def delete_variable(self, variable_id):
 
         url = "https://app.terraform.io/api/v2/workspaces/{0}/vars/{1}".format(self.id, variable_id)
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
 
-        try:
-            response = requests.delete(url,headers=header)
-            response.raise_for_status()
-            success = True
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+        await self.client.send("DELETE", url, raw=True)
 
-        return success
+        return True
 
     # -------------------------------------------------------------------------------
     # API Reference Doc - Runs
     # https://www.terraform.io/docs/cloud/api/run.html
     # -------------------------------------------------------------------------------
-    def create_run(self, payload: list):
-        
+    async def create_run(self, payload: list):
+
         url = "https://app.terraform.io/api/v2/runs"
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
         payload = json.dumps(payload)
 
-        try:
-            response = requests.post(url,data=payload, headers=header)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+        return await self.client.send("POST", url, data=payload)
 
-        return response.json()
-
-    def get_run(self, run_id, query=""):
+    async def get_run(self, run_id, query=""):
 
         url = "https://app.terraform.io/api/v2/runs/{0}{1}".format(run_id,query)
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
-
-        try:
-            response = requests.get(url, headers=header)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
 
-        return response.json()
+        return await self.client.send("GET", url)
 
-    def get_log(self,log_url, source_directory):
+    async def get_log(self, log_url, source_directory):
 
-        url = log_url
+        # PRE-SIGNED URL; THE API TOKEN IS NOT SENT
+        content = await self.client.send("GET", log_url, header={}, raw=True, check=False)
+        open(source_directory,'wb').write(content)
 
-        try:
-            log_file = requests.get(url)
-            open(source_directory,'wb').write(log_file.content)
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+    async def apply_run(self, run_id, payload: list):
 
-    def apply_run(self, run_id, payload: list):
-        
         url = "https://app.terraform.io/api/v2/runs/{0}/actions/apply".format(run_id)
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
         payload = json.dumps(payload)
 
-        try:
-            response = requests.post(url,data=payload, headers=header)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+        return await self.client.send("POST", url, data=payload)
 
-        return response.json()
-
-    def show_apply(self, apply_id):
+    async def show_apply(self, apply_id):
 
         url = "https://app.terraform.io/api/v2/applies/{0}".format(apply_id)
-        header = {
-            "content-type": "application/vnd.api+json", 
-            "Authorization": "Bearer {0}".format(self.token) 
-        }
 
-        try:
-            response = requests.get(url, headers=header)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as err:
-            raise Exception("{0}".format(err))
+        return await self.client.send("GET", url)
+
+# -------------------------------------------------------------------------------
+# Synchronous Workspace: the same methods, each run to completion on one event
+# loop shared by every Workspace in the process, so Workspaces can share a
+# client=, exactly as AsyncWorkspaces do
+# -------------------------------------------------------------------------------
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+def _background_loop():
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="terraform-workspace-loop", daemon=True).start()
+            _loop_pid = os.getpid()
+        return _loop
+
+def _delegate(attribute):
+    return property(
+        lambda self: getattr(self.workspace, attribute),
+        lambda self, value: setattr(self.workspace, attribute, value)
+    )
+
+def _blocking(method):
+    def call(self, *args, **kwargs):
+        return self._run(getattr(self.workspace, method)(*args, **kwargs))
+    call.__name__ = method
+    return call
+
+class Workspace:
+    org = _delegate("org")
+    name = _delegate("name")
+    version = _delegate("version")
+    token = _delegate("token")
+    logger = _delegate("logger")
+    id = _delegate("id")
+    config_version_id = _delegate("config_version_id")
+    upload_url = _delegate("upload_url")
+
+    def __init__(self, org, name, version, token, logger, **options):
+        self.workspace = AsyncWorkspace(org, name, version, token, logger, **options)
 
-        return response.json()
\ No newline at end of file
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, _background_loop()).result()
+
+    def close(self):
+        self._run(self.workspace.close())
+
+    def metrics(self):
+        return self.workspace.metrics()
+
+    def create_tarball(self, tarball, source_directory):
+        return self.workspace.create_tarball(tarball, source_directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    create_workspace = _blocking("create_workspace")
+    update_workspace = _blocking("update_workspace")
+    show_workspace = _blocking("show_workspace")
+    list_workspaces = _blocking("list_workspaces")
+    list_config_version = _blocking("list_config_version")
+    show_config_version = _blocking("show_config_version")
+    create_config_version = _blocking("create_config_version")
+    upload_config_files = _blocking("upload_config_files")
+    create_variable = _blocking("create_variable")
+    list_variables = _blocking("list_variables")
+    update_variable = _blocking("update_variable")
+    delete_variable = _blocking("delete_variable")
+    create_run = _blocking("create_run")
+    get_run = _blocking("get_run")
+    get_log = _blocking("get_log")
+    apply_run = _blocking("apply_run")
+    show_apply = _blocking("show_apply")
@@ -378,6 +378,9 @@ if __name__ == '__main__':
                     done = True
                 time.sleep(sleep_duration)
 
+        # CLOSE POOLED CONNECTIONS
+        ws.close()
+
     except SystemExit as err:
         logger.exception('main failed with exception')
         logger.error(str(err))
\ No newline at end of file
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# Name: test_helper.py
+# Purpose: Regression tests for the Terraform Cloud client's retry policy
+# Usage: python -m unittest tests.test_helper   (from api-driven-workflow)
+# -------------------------------------------------------------------------------
+
+# -------------------------------------------------------------------------------
+# Library Imports
+# -------------------------------------------------------------------------------
+from unittest import mock
+import email.utils
+import unittest
+import asyncio
+import logging
+import helper
+import time
+
+# -------------------------------------------------------------------------------
+# Fake aiohttp Session: answers each request with the next queued response
+# -------------------------------------------------------------------------------
+class FakeResponse:
+    def __init__(self, status, headers=None, body=b'{}'):
+        self.status = status
+        self.reason = "Status {0}".format(status)
+        self.headers = headers or {}
+        self.body = body
+
+    async def read(self):
+        return self.body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, method, url, data=None, headers=None):
+        self.requests.append((method, url))
+        return self.responses.pop(0)
+
+    async def close(self):
+        pass
+
+class AsyncClientRetryTest(unittest.TestCase):
+
+    def send(self, method, responses):
+        self.sleeps = []
+
+        async def sleep(seconds):
+            self.sleeps.append(seconds)
+
+        async def send():
+            client = helper.AsyncClient("token-{0}".format(id(self)), logging.getLogger('test'), rate_limit=1000.0)
+            client.session = FakeSession(responses)
+            client._limit = asyncio.Semaphore(1)
+            self.client = client
+            return await client.send(method, "https://app.terraform.io/api/v2/runs", data="{}")
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        with mock.patch.object(helper.asyncio, 'sleep', sleep):
+            return loop.run_until_complete(send())
+
+    # -------------------------------------------------------------------------------
+    # 429: the server did not process the request, so even a POST is retried
+    # -------------------------------------------------------------------------------
+    def test_retries_a_throttled_post(self):
+        body = self.send("POST", [FakeResponse(429), FakeResponse(201, body=b'{"data": {}}')])
+
+        self.assertEqual(body, {"data": {}})
+        self.assertEqual(len(self.client.session.requests), 2)
+        self.assertEqual(self.client.metrics()["throttled"], 1)
+
+    # -------------------------------------------------------------------------------
+    # 5xx: a POST may already have taken effect, so it is not retried
+    # -------------------------------------------------------------------------------
+    def test_does_not_retry_a_post_on_server_errors(self):
+        with self.assertRaises(Exception) as raised:
+            self.send("POST", [FakeResponse(503), FakeResponse(201)])
+
+        self.assertIn("503 Server Error", str(raised.exception))
+        self.assertEqual(len(self.client.session.requests), 1)
+        self.assertEqual(self.client.metrics()["retries"], 0)
+
+    def test_retries_a_get_on_server_errors(self):
+        body = self.send("GET", [FakeResponse(502), FakeResponse(200)])
+
+        self.assertEqual(body, {})
+        self.assertEqual(len(self.client.session.requests), 2)
+
+    # -------------------------------------------------------------------------------
+    # Retry-After: the server's wait replaces the backoff, and a 429's wait holds
+    # every caller sharing the token
+    # -------------------------------------------------------------------------------
+    def test_waits_for_retry_after(self):
+        self.send("POST", [FakeResponse(429, {"Retry-After": "7"}), FakeResponse(201)])
+
+        self.assertIn(7.0, self.sleeps)
+        self.assertGreater(self.client.bucket.reserve(), 6.0)
+
+    def test_reads_retry_after_seconds_and_dates(self):
+        later = email.utils.formatdate(time.time() + 60, usegmt=True)
+
+        self.assertEqual(helper._retry_after({"Retry-After": "2.5"}), 2.5)
+        self.assertAlmostEqual(helper._retry_after({"Retry-After": later}), 60, delta=2)
+        self.assertIsNone(helper._retry_after({"Retry-After": "soon"}))
+        self.assertIsNone(helper._retry_after({}))
+
+if __name__ == '__main__':
+    unittest.main()